@@ -0,0 +1,282 @@
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set
+
+# Lines made of one repeated punctuation character, optionally in several
+# runs as in simple table borders: section adornments, transitions and
+# simple tables, all of which depend on the blocks around them.
+ADORNMENT = re.compile(r"^([!-/:-@\[-`{-~])\1*(?: +\1+)* *$")
+
+# Top-level blocks that continue a list started by the previous block.
+LIST_ITEM = re.compile(
+    r"^(?:"
+    r"[-*+•‣⁃](?: |$)"  # bullet list
+    r"|(?:\d+|#|[a-zA-Z]|[ivxlcdmIVXLCDM]+)[.)](?: |$)"  # enumerated list
+    r"|\((?:\d+|#|[a-zA-Z]|[ivxlcdmIVXLCDM]+)\)(?: |$)"  # enumerated list
+    r"|:[^:\s][^:]*:(?: |$)"  # field list
+    r"|--?\w"  # option list
+    r")"
+)
+
+# Constructs that are resolved or numbered across the whole document:
+# substitutions, footnotes and citations, hyperlink targets and references.
+CROSS_BLOCK = re.compile(
+    r"^\s*\.\. \|"  # substitution definition
+    r"|^\s*\.\. \["  # footnote or citation
+    r"|\[[^\]\s]+\]_"  # footnote or citation reference
+    r"|^\s*\.\. _"  # hyperlink target
+    r"|^\s*__ "  # anonymous hyperlink target
+    r"|`__?(?!\w)"  # phrase reference
+    r"|(?<![\w`])\w[\w.+-]*__?(?![\w])",  # reference
+    re.MULTILINE,
+)
+
+# Directives whose effect reaches past their own block.
+DIRECTIVE = re.compile(r"^\s*\.\. ([\w:-]+)::", re.MULTILINE)
+STATEFUL_DIRECTIVES = frozenset(
+    [
+        "class",
+        "contents",
+        "default-domain",
+        "default-role",
+        "footer",
+        "header",
+        "highlight",
+        "include",
+        "meta",
+        "role",
+        "rst-class",
+        "sectnum",
+        "section-numbering",
+        "tabularcolumns",
+        "target-notes",
+        "title",
+        "c:namespace",
+        "c:namespace-pop",
+        "c:namespace-push",
+        "cpp:namespace",
+        "cpp:namespace-pop",
+        "cpp:namespace-push",
+        "currentmodule",
+        "module",
+        "py:currentmodule",
+        "py:module",
+        "js:module",
+    ]
+)
+
+HTML_ID = re.compile(r'\bid="([^"]*)"')
+
+
+def _is_list_item(block: str) -> bool:
+    lines = block.split("\n", 2)
+    if LIST_ITEM.match(lines[0]):
+        return True
+    # A definition list item: a term followed directly by an indented
+    # definition.
+    return (
+        len(lines) > 1
+        and not lines[0].startswith("..")
+        and lines[1][:1].isspace()
+        and bool(lines[1].strip())
+    )
+
+
+def split_blocks(rst: str) -> List[str]:
+    """Split RST source into top-level blocks.
+
+    A block starts at a line without indentation that follows a blank
+    line, and keeps its indented continuation and the blank lines after it.
+    Consecutive list items stay in one block, so that a list is never
+    rendered in pieces. The blocks joined together are the source again.
+    """
+    blocks: List[List[str]] = []
+    previous_blank = True
+    for line in rst.splitlines(keepends=True):
+        blank = not line.strip()
+        if not blank and previous_blank and not line[:1].isspace():
+            blocks.append([])
+        elif not blocks:
+            blocks.append([])
+        blocks[-1].append(line)
+        previous_blank = blank
+
+    merged: List[str] = []
+    previous_list = False
+    for lines in blocks:
+        block = "".join(lines)
+        is_list = bool(block.strip()) and _is_list_item(block)
+        if merged and is_list and previous_list:
+            merged[-1] += block
+        else:
+            merged.append(block)
+        previous_list = is_list
+    return merged
+
+
+def needs_full_render(rst: str) -> bool:
+    """Whether rendering rst block by block could differ from rendering it
+    in one piece."""
+    for line in rst.splitlines():
+        if ADORNMENT.match(line):
+            return True
+    if CROSS_BLOCK.search(rst):
+        return True
+    return any(
+        name in STATEFUL_DIRECTIVES for name in DIRECTIVE.findall(rst)
+    )
+
+
+def _short_name(name: str) -> str:
+    # "ns::f()", "module.f" and "f" all match each other.
+    return re.split(r"::|\.", name.rstrip("()"))[-1]
+
+
+class RenderedBlock(NamedTuple):
+    html: str
+    ids: FrozenSet[str]
+    # Short names of the objects and labels the block declares, and of the
+    # cross-reference targets it could not resolve on its own.
+    declared: FrozenSet[str]
+    missing: FrozenSet[str]
+
+
+class BlockRenderer:
+    """Renders a fragment block by block and reuses the HTML of blocks
+    whose source has not changed.
+
+    The rendered blocks are kept in an LRU bounded by the length of their
+    source and HTML, so an edit to one paragraph of a long fragment
+    re-renders only that paragraph. Fragments with constructs that span
+    blocks are rendered in one piece. So is a fragment with a block that
+    cannot resolve a cross-reference to an object declared by another
+    block, and a fragment whose blocks end up with the same HTML id, since
+    a full render would have numbered the ids across the whole fragment.
+    """
+
+    def __init__(self, builder, memory_max_bytes: int = 64 * 1024 * 1024):
+        self.builder = builder
+        self.memory_max_bytes = memory_max_bytes
+        self.fingerprint: Optional[str] = None
+        self.blocks: "OrderedDict[str, RenderedBlock]" = OrderedDict()
+        self.memory_bytes = 0
+
+        # Filled in while a block is rendered.
+        self.declared: Optional[Set[str]] = None
+        self.missing: Optional[Set[str]] = None
+        builder.app.connect("doctree-resolved", self.note_declarations)
+        # A low priority, so that this runs only when no other listener,
+        # such as intersphinx, has resolved the reference.
+        builder.app.connect(
+            "missing-reference", self.note_missing_reference, priority=900
+        )
+
+        self.renders = 0
+        self.full_renders = 0
+        self.blocks_rendered = 0
+        self.blocks_reused = 0
+
+    def render(self, rst: str) -> str:
+        self.renders += 1
+        blocks = [block for block in split_blocks(rst) if block.strip()]
+        if len(blocks) <= 1:
+            return self.render_full(rst)
+
+        fingerprint = self.builder.get_render_context().fingerprint
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.blocks.clear()
+            self.memory_bytes = 0
+
+        rendered_blocks = []
+        new_blocks: Dict[str, RenderedBlock] = {}
+        for block in blocks:
+            rendered_block = self.blocks.get(block)
+            if rendered_block is None:
+                rendered_block = new_blocks.get(block)
+                if rendered_block is None:
+                    # The checks only look at single lines, and the blocks
+                    # in the LRU have passed them already.
+                    if needs_full_render(block):
+                        return self.render_full(rst)
+                    rendered_block = self.render_block(block)
+                    new_blocks[block] = rendered_block
+                else:
+                    self.blocks_reused += 1
+            else:
+                self.blocks.move_to_end(block)
+                self.blocks_reused += 1
+            rendered_blocks.append(rendered_block)
+
+        if not self.is_independent(rendered_blocks):
+            return self.render_full(rst)
+
+        # Only blocks that passed the checks are remembered.
+        for block, rendered_block in new_blocks.items():
+            self.remember(block, rendered_block)
+        self.blocks_rendered += len(new_blocks)
+        return "".join(rendered_block.html for rendered_block in rendered_blocks)
+
+    def render_block(self, block: str) -> RenderedBlock:
+        self.declared, self.missing = set(), set()
+        try:
+            html = self.builder.render_document(block)
+            return RenderedBlock(
+                html,
+                frozenset(HTML_ID.findall(html)),
+                frozenset(self.declared),
+                frozenset(self.missing),
+            )
+        finally:
+            self.declared, self.missing = None, None
+
+    def render_full(self, rst: str) -> str:
+        self.full_renders += 1
+        return self.builder.render_document(rst)
+
+    @staticmethod
+    def is_independent(rendered_blocks: List[RenderedBlock]) -> bool:
+        """Whether the blocks render the same on their own as together."""
+        declared: Counter = Counter()
+        ids: Set[str] = set()
+        for rendered_block in rendered_blocks:
+            declared.update(rendered_block.declared)
+            if not ids.isdisjoint(rendered_block.ids):
+                return False
+            ids.update(rendered_block.ids)
+        for rendered_block in rendered_blocks:
+            for name in rendered_block.missing:
+                # Declared by a block other than the one that misses it.
+                if declared[name] > (name in rendered_block.declared):
+                    return False
+        return True
+
+    def remember(self, block: str, rendered_block: RenderedBlock) -> None:
+        self.blocks[block] = rendered_block
+        self.memory_bytes += len(block) + len(rendered_block.html)
+        while self.memory_bytes > self.memory_max_bytes and self.blocks:
+            evicted_block, evicted = self.blocks.popitem(last=False)
+            self.memory_bytes -= len(evicted_block) + len(evicted.html)
+
+    def note_declarations(self, app, doctree, docname: str) -> None:
+        if self.declared is None:
+            return
+        for domain in app.env.domains.values():
+            for name, dispname, _, object_docname, _, _ in domain.get_objects():
+                if object_docname == docname:
+                    self.declared.add(_short_name(name))
+                    self.declared.add(_short_name(dispname))
+
+    def note_missing_reference(self, app, env, node, contnode) -> None:
+        if self.missing is not None:
+            self.missing.add(_short_name(node.get("reftarget", "")))
+
+    def stats(self) -> dict:
+        return {
+            "renders": self.renders,
+            "full_renders": self.full_renders,
+            "blocks_rendered": self.blocks_rendered,
+            "blocks_reused": self.blocks_reused,
+            "cached_blocks": len(self.blocks),
+            "memory_bytes": self.memory_bytes,
+        }
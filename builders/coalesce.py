@@ -0,0 +1,115 @@
+import re
+import secrets
+from typing import List, Optional
+
+from builders.block_render import DIRECTIVE, needs_full_render
+
+# A field list at the start of a document is its metadata, so it renders
+# differently after another fragment.
+FIELD_MARKER = re.compile(r"^:[^:\s][^:]*:(?: |$)", re.MULTILINE)
+
+# HTML that depends on the rest of the document: ids, which are numbered
+# and deduplicated across it, links within the page, and object
+# descriptions, whose ids are left out when an earlier fragment declares
+# the same object.
+DEPENDENT_HTML = re.compile(r'\bid="|\bhref="#|\bsig-object\b')
+
+# Directives whose output depends on the rest of the document, besides
+# those that already make needs_full_render() true.
+DOCUMENT_DIRECTIVES = frozenset(["toctree"])
+
+
+def can_coalesce(rst: str) -> bool:
+    """Whether rst can be rendered in one document with other fragments."""
+    if needs_full_render(rst) or FIELD_MARKER.search(rst):
+        return False
+    # An expanded literal block would swallow the boundary after it.
+    if rst.rstrip().endswith("::"):
+        return False
+    return not any(
+        name in DOCUMENT_DIRECTIVES for name in DIRECTIVE.findall(rst)
+    )
+
+
+class FragmentCoalescer:
+    """Renders several small fragments as one document.
+
+    The fragments are joined with a raw HTML comment between them, which
+    ends whatever block a fragment ends with, followed by an empty comment,
+    which keeps an indented fragment out of the raw directive. The HTML of
+    the combined document is split at the raw comments again. That pays
+    the per-document cost of reading, resolving and writing once per batch
+    instead of once per fragment.
+
+    Only fragments for which can_coalesce() is true are joined. A fragment
+    whose HTML depends on the rest of the batch, see DEPENDENT_HTML, is
+    rendered again on its own, and so is the whole batch if a boundary went
+    missing or rendering it failed. The output is always
+    what rendering each fragment on its own produces.
+    """
+
+    def __init__(self, builder) -> None:
+        self.builder = builder
+        self.token = secrets.token_hex(8)
+        self.boundary_html = f"<!-- fragment boundary {self.token} -->"
+        self.boundary_rst = (
+            f"\n\n.. raw:: html\n\n   {self.boundary_html}\n\n..\n\n"
+        )
+
+        self.batches = 0
+        self.fragments_coalesced = 0
+        self.fragments_rendered_alone = 0
+        self.failed_batches = 0
+
+    def can_coalesce(self, rst: str) -> bool:
+        return self.token not in rst and can_coalesce(rst)
+
+    def render_batch(self, fragments: List[str]) -> List[str]:
+        """Render fragments that passed can_coalesce(), in the input
+        order."""
+        outputs: List[Optional[str]] = [None] * len(fragments)
+        if len(fragments) > 1:
+            coalesced_outputs = self.render_coalesced(fragments)
+            if coalesced_outputs is None:
+                self.failed_batches += 1
+            else:
+                self.batches += 1
+                outputs = coalesced_outputs
+
+        for index, fragment in enumerate(fragments):
+            if outputs[index] is None:
+                outputs[index] = self.builder.render_document(fragment)
+                self.fragments_rendered_alone += 1
+            else:
+                self.fragments_coalesced += 1
+        return outputs
+
+    def render_coalesced(
+        self, fragments: List[str]
+    ) -> Optional[List[Optional[str]]]:
+        """The HTML of each fragment, or None for the fragments that depend
+        on the rest of the batch; None if the batch has to be rendered
+        fragment by fragment."""
+        try:
+            html = self.builder.render_document(
+                self.boundary_rst.join(fragments)
+            )
+        except Exception:  # pylint: disable=broad-except
+            # Rendered again one by one, which raises for the fragment
+            # that fails.
+            return None
+        outputs = html.split(self.boundary_html)
+        if len(outputs) != len(fragments):
+            return None
+        return [
+            None if DEPENDENT_HTML.search(output) else output
+            for output in outputs
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "fragments_coalesced": self.fragments_coalesced,
+            "fragments_rendered_alone": self.fragments_rendered_alone,
+            "failed_batches": self.failed_batches,
+        }
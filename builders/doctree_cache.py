@@ -0,0 +1,217 @@
+import copy
+import hashlib
+import json
+import pickle
+import time
+import zlib
+from typing import Callable, Dict, Optional
+
+import docutils
+import sphinx
+from docutils import nodes
+from sphinx.application import Sphinx
+from sphinx.domains import Domain
+from sphinx.environment.collectors.asset import (
+    DownloadFileCollector,
+    ImageCollector,
+)
+from sphinx.util.docutils import LoggingReporter
+
+from builders.block_render import DIRECTIVE
+from builders.doxygen_directive_cache import DOXYGEN_DIRECTIVES
+from builders.doxygen_index import doxygen_xml_digest
+from builders.fragment_cache import FragmentCache, reads_other_files
+
+# Environment collectors whose data is only used to copy files when a
+# whole project is finished, which the minimal builder never does.
+WRITE_INDEPENDENT_COLLECTORS = (ImageCollector, DownloadFileCollector)
+
+# Rebuild kinds that name an output format: changing such a configuration
+# value does not change what is read.
+OUTPUT_REBUILDS = frozenset(["html", "gettext", "latex", "epub", "text"])
+
+# Domain data that domains create lazily, but that their merge_domaindata()
+# expects.
+LAZY_DOMAIN_DATA = {
+    "std": ("terms",),
+    "citation": ("citations", "citation_refs"),
+}
+
+
+def reader_fingerprint(app: Sphinx) -> str:
+    """Hash everything besides the RST source that changes the doctree of a
+    fragment before references are resolved.
+
+    Unlike config_fingerprint(), this leaves out the configuration values
+    that only matter to an output format, such as the theme and the other
+    html_* values.
+    """
+    config = app.config
+    values = {
+        name: getattr(config, name, None)
+        for name, (_, rebuild, _) in config.values.items()
+        if rebuild not in OUTPUT_REBUILDS
+    }
+    fingerprint = {
+        "builder": app.builder.name,
+        "config": values,
+        "sphinx": sphinx.__version__,
+        "docutils": docutils.__version__,
+    }
+    dump = json.dumps(fingerprint, sort_keys=True, default=repr)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
+def dump_doctree(doctree: nodes.document, domaindata: dict) -> bytes:
+    """Serialize doctree, leaving it usable, like Builder.write_doctree()
+    does before pickling."""
+    reporter, transformer = doctree.reporter, doctree.transformer
+    settings = doctree.settings
+    doctree.reporter = None
+    doctree.transformer = None
+    doctree.settings = settings.copy()
+    doctree.settings.warning_stream = None
+    doctree.settings.env = None
+    doctree.settings.record_dependencies = None
+    try:
+        pickled = pickle.dumps((doctree, domaindata), pickle.HIGHEST_PROTOCOL)
+    finally:
+        doctree.reporter, doctree.transformer = reporter, transformer
+        doctree.settings = settings
+    # Doctrees compress well, and decompressing is cheap next to parsing.
+    return zlib.compress(pickled, 1)
+
+
+class DoctreeCache:
+    """Reuses the doctrees of fragments that were read before.
+
+    Entries are keyed by the docname, the RST source, a fingerprint of the
+    configuration values that reading depends on and, for fragments with a
+    doxygen directive, of the Doxygen XML. So a render after a change to
+    the theme, to other html_* options or to the translator goes straight
+    from the unpickled doctree to writing. Next to the doctree, an entry
+    keeps what reading added to the domain data, which is merged back in
+    on a hit, as in DoxygenDirectiveCache. The entries are compressed
+    pickles in a FragmentCache, with an optional disk tier.
+
+    Nothing is cached while an environment collector besides those for
+    images and downloads is enabled, since a hit would skip it, or while a
+    domain cannot merge domain data. Neither are fragments that read other
+    files, which the key does not cover.
+    """
+
+    def __init__(
+        self,
+        app: Sphinx,
+        cache_dir: Optional[str] = None,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        refresh_interval: float = 1.0,
+    ) -> None:
+        self.app = app
+        self.store = FragmentCache(
+            reader_fingerprint(app),
+            memory_max_bytes=memory_max_bytes,
+            cache_dir=cache_dir,
+            binary=True,
+            suffix=".doctree",
+        )
+        self.refresh_interval = refresh_interval
+        self.xml_digest: Optional[str] = None
+        self.xml_digest_time = 0.0
+        self.domains_mergeable = all(
+            type(domain).merge_domaindata is not Domain.merge_domaindata
+            for domain in app.env.domains.values()
+        )
+
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def get_xml_digest(self) -> str:
+        now = time.monotonic()
+        if (
+            self.xml_digest is None
+            or now - self.xml_digest_time > self.refresh_interval
+        ):
+            self.xml_digest = doxygen_xml_digest(self.app)
+            self.xml_digest_time = now
+        return self.xml_digest
+
+    def key(self, docname: str, rst: str) -> str:
+        key = f"{docname}\0{rst}"
+        if any(name in DOXYGEN_DIRECTIVES for name in DIRECTIVE.findall(rst)):
+            key = f"{self.get_xml_digest()}\0{key}"
+        return key
+
+    def is_cacheable(self) -> bool:
+        if not self.domains_mergeable:
+            return False
+        return all(
+            collector.listener_ids is None
+            or isinstance(collector, WRITE_INDEPENDENT_COLLECTORS)
+            for collector in self.app.builder.env_collectors
+        )
+
+    def read(
+        self,
+        docname: str,
+        rst: str,
+        parse: Callable[[str], nodes.document],
+    ) -> nodes.document:
+        """The doctree of rst read as docname, from the cache or from
+        parse(docname)."""
+        # Configures the environment collectors, see is_cacheable().
+        self.app.builder.get_render_context()
+        if not self.is_cacheable() or reads_other_files(rst):
+            self.uncached += 1
+            return parse(docname)
+
+        env = self.app.env
+        key = self.key(docname, rst)
+        entry = self.store.get(key)
+        if entry is not None:
+            self.hits += 1
+            doctree, domaindata = pickle.loads(zlib.decompress(entry))
+            self._merge_domaindata(docname, domaindata)
+            # What BuildEnvironment.get_doctree() does after unpickling.
+            doctree.settings.env = env
+            doctree.reporter = LoggingReporter(env.doc2path(docname))
+            return doctree
+
+        self.misses += 1
+        domains: Dict[str, Domain] = env.domains
+        saved_data = {name: domain.data for name, domain in domains.items()}
+        for name, domain in domains.items():
+            domain.data = env.domaindata[name] = copy.deepcopy(
+                {**domain.initial_data, "version": domain.data_version}
+            )
+        try:
+            doctree = parse(docname)
+        finally:
+            domaindata = {name: domain.data for name, domain in domains.items()}
+            for name, domain in domains.items():
+                domain.data = env.domaindata[name] = saved_data[name]
+        for name, lazy_keys in LAZY_DOMAIN_DATA.items():
+            if name in domaindata:
+                for lazy_key in lazy_keys:
+                    domaindata[name].setdefault(lazy_key, {})
+
+        self.store.put(key, dump_doctree(doctree, domaindata))
+        self._merge_domaindata(docname, domaindata)
+        return doctree
+
+    def _merge_domaindata(self, docname: str, domaindata: dict) -> None:
+        for name, domain in self.app.env.domains.items():
+            if name in domaindata:
+                domain.merge_domaindata([docname], domaindata[name])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "memory_hits": self.store.memory_hits,
+            "disk_hits": self.store.disk_hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "memory_bytes": self.store.memory_bytes,
+            "disk_bytes": self.store.disk_bytes,
+        }
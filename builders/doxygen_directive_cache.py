@@ -0,0 +1,313 @@
+import copy
+import pickle
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from docutils import nodes
+from docutils.parsers.rst import directives
+from sphinx.application import Sphinx
+from sphinx.domains import Domain
+from sphinx.environment import BuildEnvironment
+
+from builders.doxygen_index import doxygen_xml_digest
+
+DOXYGEN_DIRECTIVES = [
+    "doxygenindex",
+    "doxygenfunction",
+    "doxygenstruct",
+    "doxygenclass",
+    "doxygeninterface",
+    "doxygenvariable",
+    "doxygendefine",
+    "doxygenconcept",
+    "doxygenenum",
+    "doxygenenumvalue",
+    "doxygentypedef",
+    "doxygenunion",
+    "doxygennamespace",
+    "doxygengroup",
+    "doxygenfile",
+    "doxygenpage",
+]
+
+
+# The domains in which breathe declares the documented objects.
+DOXYGEN_DOMAINS = ["c", "cpp", "py"]
+
+
+def _doxygen_domains(env: BuildEnvironment) -> Dict[str, Domain]:
+    return {
+        name: env.domains[name]
+        for name in DOXYGEN_DOMAINS
+        if name in env.domains
+    }
+
+
+def _in_nested_scope(env: BuildEnvironment) -> bool:
+    """Whether a namespace, module or class directive has made a scope other
+    than the root the current one, which the declarations are nested in."""
+    for name in ("c", "cpp"):
+        parent_symbol = env.temp_data.get(f"{name}:parent_symbol")
+        if (
+            parent_symbol is not None
+            and name in env.domaindata
+            and parent_symbol is not env.domaindata[name]["root_symbol"]
+        ):
+            return True
+    return bool(
+        env.ref_context.get("py:module") or env.ref_context.get("py:class")
+    )
+
+
+# The node attributes in which breathe and the domains record the document
+# that a node was created in.
+DOCNAME_ATTRIBUTES = ["refdoc", "docname"]
+
+
+def _copy_node(node: nodes.Node) -> nodes.Node:
+    """Copy a node tree, detached from any document.
+
+    Node.deepcopy() re-creates elements through their constructors, and
+    some Sphinx nodes, like desc_sig_space, add their default text again
+    when constructed with children.
+    """
+    if isinstance(node, nodes.Text):
+        return node.deepcopy()
+
+    node_copy = node.__class__.__new__(node.__class__)
+    node_copy.__dict__.update(node.__dict__)
+    node_copy.attributes = {
+        name: value[:] if isinstance(value, list) else value
+        for name, value in node.attributes.items()
+    }
+    node_copy.parent = None
+    node_copy.document = None
+    node_copy.children = []
+    node_copy.extend(_copy_node(child) for child in node.children)
+    return node_copy
+
+
+def _move_nodes(
+    result: List[nodes.Node], from_docname: str, to_docname: str
+) -> None:
+    for result_node in result:
+        for node in result_node.findall(nodes.Element):
+            for attribute in DOCNAME_ATTRIBUTES:
+                if node.get(attribute) == from_docname:
+                    node[attribute] = to_docname
+
+
+def _move_domaindata(
+    domaindata: dict, from_docname: str, to_docname: str
+) -> None:
+    """Make the objects that were declared in from_docname belong to
+    to_docname, which merge_domaindata() goes by.
+
+    The C and C++ domains keep a symbol tree, the other data maps names to
+    a docname or to a tuple that starts with the docname.
+    """
+    for data in domaindata.values():
+        for value in data.values():
+            if hasattr(value, "get_all_symbols"):
+                for symbol in value.get_all_symbols():
+                    if symbol.docname == from_docname:
+                        symbol.docname = to_docname
+            elif isinstance(value, dict):
+                for name, entry in value.items():
+                    if entry == from_docname:
+                        value[name] = to_docname
+                    elif isinstance(entry, tuple) and entry[:1] == (
+                        from_docname,
+                    ):
+                        moved = (to_docname, *entry[1:])
+                        value[name] = (
+                            entry._make(moved)
+                            if hasattr(entry, "_make")
+                            else moved
+                        )
+
+
+# The nodes, the pickled domain data and the document that they were
+# created in.
+Entry = Tuple[List[nodes.Node], bytes, str]
+
+
+class DoxygenDirectiveCache:
+    """Memoizes the node subtrees produced by breathe's directives.
+
+    Besides the nodes, a directive registers the objects it declares in the
+    C, C++ or Python domain, which is what the links between the generated
+    declarations resolve against. On a miss the directive therefore runs
+    against empty domain data; what it adds is kept next to the nodes,
+    merged into the real domain data and merged again on every hit.
+
+    Entries are keyed by the directive name, arguments, options, content
+    and a digest of the Doxygen XML files, so a directive that occurs again
+    in another document is a hit too. Inside a C or C++ namespace, or a
+    Python module or class, the directive runs uncached, since its
+    declarations are nested in that scope. The document that the entry was
+    created in is kept with it, and on a hit in another document the nodes
+    and the domain data are moved to that document. While the objects of an
+    entry are still declared in another document, the directive runs
+    uncached instead, so that the domains report the duplicate declaration
+    as they would without the cache. The digest is re-taken at most every
+    refresh_interval seconds so that a large XML directory is not stat'ed
+    for every directive. Up to max_entries entries are kept, the least
+    recently used are dropped first.
+    """
+
+    def __init__(
+        self,
+        app: Sphinx,
+        refresh_interval: float = 1.0,
+        max_entries: int = 1024,
+    ) -> None:
+        self.app = app
+        self.refresh_interval = refresh_interval
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, Entry]" = OrderedDict()
+        # The documents whose domain data the objects of an entry were
+        # merged into, until Sphinx purges them.
+        self.declared_in: Dict[tuple, Set[str]] = {}
+        self.xml_digest: Optional[str] = None
+        self.xml_digest_time = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.scoped = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "duplicates": self.duplicates,
+            "scoped": self.scoped,
+            "entries": len(self.entries),
+        }
+
+    def purge_doc(self, app: Sphinx, env: BuildEnvironment, docname: str):
+        for key, docnames in list(self.declared_in.items()):
+            docnames.discard(docname)
+            if not docnames:
+                del self.declared_in[key]
+
+    def get_xml_digest(self) -> str:
+        now = time.monotonic()
+        if (
+            self.xml_digest is None
+            or now - self.xml_digest_time > self.refresh_interval
+        ):
+            digest = doxygen_xml_digest(self.app)
+            if digest != self.xml_digest:
+                self.entries.clear()
+                self.declared_in.clear()
+            self.xml_digest = digest
+            self.xml_digest_time = now
+        return self.xml_digest
+
+    def run(self, directive) -> List[nodes.Node]:
+        env = directive.state.document.settings.env
+        if _in_nested_scope(env):
+            self.scoped += 1
+            return directive.run_uncached()
+
+        key = (
+            directive.name,
+            tuple(directive.arguments),
+            tuple(sorted(directive.options.items())),
+            tuple(directive.content),
+            self.get_xml_digest(),
+        )
+
+        declared_in = self.declared_in.setdefault(key, set())
+        if declared_in - {env.docname}:
+            self.duplicates += 1
+            return directive.run_uncached()
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            cached_result, pickled_domaindata, docname = entry
+            result = [_copy_node(node) for node in cached_result]
+            domaindata = pickle.loads(pickled_domaindata)
+            if docname != env.docname:
+                _move_nodes(result, docname, env.docname)
+                _move_domaindata(domaindata, docname, env.docname)
+            self._merge_domaindata(env, domaindata)
+            declared_in.add(env.docname)
+            return result
+
+        self.misses += 1
+        domains = _doxygen_domains(env)
+        saved_data = {name: domain.data for name, domain in domains.items()}
+        # The C and C++ domains remember their current scope as a symbol of
+        # the data tree, which must not leak from one tree into the other.
+        saved_temp_data = {
+            name: env.temp_data.pop(name)
+            for name in list(env.temp_data)
+            if name.endswith(":parent_symbol")
+        }
+        for name, domain in domains.items():
+            domain.data = env.domaindata[name] = copy.deepcopy(
+                {**domain.initial_data, "version": domain.data_version}
+            )
+        try:
+            result = directive.run_uncached()
+        finally:
+            domaindata = {name: domain.data for name, domain in domains.items()}
+            for name, domain in domains.items():
+                domain.data = env.domaindata[name] = saved_data[name]
+            for name in list(env.temp_data):
+                if name.endswith(":parent_symbol"):
+                    del env.temp_data[name]
+            env.temp_data.update(saved_temp_data)
+
+        # Only successful expansions are memoized: error reports must keep
+        # coming from the directive itself.
+        if not any(
+            isinstance(node, nodes.system_message)
+            for result_node in result
+            for node in result_node.findall()
+        ):
+            # Pickled rather than deep-copied: deep-copying the C and C++
+            # symbol trees yields empty trees.
+            self.entries[key] = (
+                [_copy_node(node) for node in result],
+                pickle.dumps(domaindata, pickle.HIGHEST_PROTOCOL),
+                env.docname,
+            )
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._merge_domaindata(env, domaindata)
+        declared_in.add(env.docname)
+        return result
+
+    @staticmethod
+    def _merge_domaindata(env: BuildEnvironment, domaindata: dict) -> None:
+        for name, domain in _doxygen_domains(env).items():
+            domain.merge_domaindata([env.docname], domaindata[name])
+
+
+def install_doxygen_directive_cache(app: Sphinx) -> DoxygenDirectiveCache:
+    """Replace breathe's directives with memoizing subclasses."""
+    cache = DoxygenDirectiveCache(app)
+
+    for name in DOXYGEN_DIRECTIVES:
+        directive_class, _ = directives.directive(name, None, None)
+        if directive_class is None:
+            continue
+
+        memoized_class = type(
+            f"Memoized{directive_class.__name__}",
+            (directive_class,),
+            {
+                "run": lambda self: cache.run(self),
+                "run_uncached": directive_class.run,
+            },
+        )
+        app.add_directive(name, memoized_class, override=True)
+
+    app.connect("env-purge-doc", cache.purge_doc)
+    return cache
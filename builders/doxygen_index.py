@@ -0,0 +1,205 @@
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import breathe
+from breathe import path_handler
+from sphinx.application import Sphinx
+
+# File layout: MAGIC, the length of the header as an unsigned 64-bit
+# integer, the pickled header and then one pickled blob per XML file. The
+# header maps every file to the offset and length of its blob, so a single
+# compound can be unpickled straight from the memory map without touching
+# the rest of the index.
+MAGIC = b"DOXYGEN-INDEX-1\n"
+HEADER_LENGTH = struct.Struct(">Q")
+
+
+def index_versions() -> Dict[str, str]:
+    """The versions that the pickled breathe objects depend on."""
+    return {"python": sys.version, "breathe": breathe.__version__}
+
+
+def doxygen_xml_files(app: Sphinx) -> Dict[str, Tuple[int, int]]:
+    """Map every Doxygen XML file of every breathe project to its stat."""
+    files = {}
+    for project_path in app.config.breathe_projects.values():
+        directory = path_handler.resolve_path(app, project_path, "")
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".xml"):
+                stat = entry.stat()
+                files[os.path.join(directory, entry.name)] = (
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+    return files
+
+
+def doxygen_xml_digest(app: Sphinx) -> str:
+    """Hash the path, size and modification time of every Doxygen XML
+    file."""
+    files = sorted(doxygen_xml_files(app).items())
+    return hashlib.sha256(repr(files).encode("utf-8")).hexdigest()
+
+
+def doxygen_index_supported() -> bool:
+    """Whether breathe parses Doxygen XML with the per-file parsers of
+    breathe 4, whose results the index stores. breathe 5 replaced them."""
+    try:
+        # pylint: disable=import-outside-toplevel,unused-import
+        from breathe.parser import compound, index
+    except ImportError:
+        return False
+    return True
+
+
+def compile_doxygen_index(app: Sphinx, path_to_index: str) -> None:
+    """Parse the XML of all configured breathe_projects into one index file."""
+    from breathe.parser import (  # pylint: disable=import-outside-toplevel
+        compound,
+        index,
+    )
+
+    files = doxygen_xml_files(app)
+    blobs: Dict[str, bytes] = {}
+
+    for project_path in app.config.breathe_projects.values():
+        path_to_index_xml = path_handler.resolve_path(
+            app, project_path, "index.xml"
+        )
+        index_tree = index.parse(path_to_index_xml)
+        blobs[path_to_index_xml] = pickle.dumps(
+            index_tree, pickle.HIGHEST_PROTOCOL
+        )
+
+        for compound_entry in index_tree.compound:
+            path_to_compound_xml = path_handler.resolve_path(
+                app, project_path, f"{compound_entry.refid}.xml"
+            )
+            if path_to_compound_xml not in blobs:
+                blobs[path_to_compound_xml] = pickle.dumps(
+                    compound.parse(path_to_compound_xml),
+                    pickle.HIGHEST_PROTOCOL,
+                )
+
+    offsets = {}
+    offset = 0
+    for filename, blob in blobs.items():
+        offsets[filename] = (offset, len(blob))
+        offset += len(blob)
+
+    header = pickle.dumps(
+        {
+            "files": files,
+            "versions": index_versions(),
+            "offsets": offsets,
+        },
+        pickle.HIGHEST_PROTOCOL,
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(path_to_index)), exist_ok=True)
+    path_to_tmp = f"{path_to_index}.{os.getpid()}.tmp"
+    with open(path_to_tmp, "wb") as file:
+        file.write(MAGIC)
+        file.write(HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        for blob in blobs.values():
+            file.write(blob)
+    os.replace(path_to_tmp, path_to_index)
+
+
+class DoxygenIndex(dict):
+    """Parsed Doxygen XML that is unpickled from a memory map on demand.
+
+    It is a drop-in replacement for the filename -> parsed XML dict that
+    breathe's DoxygenParserFactory uses as its cache.
+    """
+
+    def __init__(self, path_to_index: str) -> None:
+        super().__init__()
+        # Whether load_doxygen_index() had to compile the index.
+        self.compiled = False
+        # XML files unpickled from the index, and those that breathe had to
+        # parse because they are not in it.
+        self.hits = 0
+        self.misses = 0
+        with open(path_to_index, "rb") as file:
+            self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"not a Doxygen index: {path_to_index}")
+        position = len(MAGIC)
+        (header_length,) = HEADER_LENGTH.unpack_from(self.mapped, position)
+        position += HEADER_LENGTH.size
+        header = pickle.loads(self.mapped[position:position + header_length])
+
+        self.blobs_start = position + header_length
+        self.files: Dict[str, Tuple[int, int]] = header["files"]
+        self.versions: Optional[Dict[str, str]] = header.get("versions")
+        self.offsets: Dict[str, Tuple[int, int]] = header["offsets"]
+
+    def __missing__(self, filename: str):
+        if filename not in self.offsets:
+            self.misses += 1
+            raise KeyError(filename)
+        self.hits += 1
+        offset, length = self.offsets[filename]
+        start = self.blobs_start + offset
+        parsed = pickle.loads(self.mapped[start:start + length])
+        self[filename] = parsed
+        return parsed
+
+    def is_up_to_date(self, app: Sphinx) -> bool:
+        return (
+            self.versions == index_versions()
+            and self.files == doxygen_xml_files(app)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "compiled": self.compiled,
+            "files": len(self.offsets),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def load_doxygen_index(app: Sphinx, path_to_index: str) -> DoxygenIndex:
+    """Load the index, recompiling it first if any XML file has changed."""
+    if not doxygen_index_supported():
+        raise RuntimeError(
+            f"the Doxygen index requires breathe 4, not {breathe.__version__}"
+        )
+    doxygen_index: Optional[DoxygenIndex] = None
+    if os.path.isfile(path_to_index):
+        try:
+            doxygen_index = DoxygenIndex(path_to_index)
+        except ValueError:
+            doxygen_index = None
+    if doxygen_index is not None and not doxygen_index.is_up_to_date(app):
+        doxygen_index.mapped.close()
+        doxygen_index = None
+    if doxygen_index is None:
+        compile_doxygen_index(app, path_to_index)
+        doxygen_index = DoxygenIndex(path_to_index)
+        doxygen_index.compiled = True
+    return doxygen_index
+
+
+def install_doxygen_index(app: Sphinx, doxygen_index: DoxygenIndex) -> None:
+    """Make breathe's XML parsers read from doxygen_index."""
+
+    def use_doxygen_index(app: Sphinx, docname: str, source: List[str]):
+        # breathe hands its parser factory to the directives through
+        # env.temp_data on source-read, so this listener runs after it.
+        parser_factory = app.env.temp_data.get("breathe_parser_factory")
+        if parser_factory is not None:
+            parser_factory.cache = doxygen_index
+
+    app.connect("source-read", use_doxygen_index, priority=900)
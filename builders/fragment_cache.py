@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import AnyStr, Dict, Optional
+
+import docutils
+import sphinx
+from sphinx.application import Sphinx
+
+from builders.doxygen_index import doxygen_xml_digest
+
+# The directives that read other files, and the :file: option of raw and
+# csv-table. The cache keys only cover the RST source itself.
+FILE_DIRECTIVE = re.compile(
+    r"^\s*(?:\.\.\s+(?:include|literalinclude)::|:file:\s)", re.MULTILINE
+)
+
+
+def reads_other_files(rst: str) -> bool:
+    """Whether rst reads other files, whose changes a cached rendering of rst
+    would not follow."""
+    return FILE_DIRECTIVE.search(rst) is not None
+
+
+def conf_py_digest(app: Sphinx) -> Optional[str]:
+    path_to_conf_py = os.path.join(app.confdir, "conf.py")
+    try:
+        with open(path_to_conf_py, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def config_fingerprint(app: Sphinx) -> str:
+    """Hash everything besides the RST source that changes the output HTML.
+
+    Besides the configuration values, that is conf.py itself, for the
+    values and extension settings that it sets up, and the Doxygen XML
+    that breathe renders.
+    """
+    config = app.config
+    target_index = getattr(app.builder, "target_index", None)
+    fingerprint = {
+        "builder": app.builder.name,
+        "confoverrides": config.overrides,
+        "html_theme": config.html_theme,
+        "html_theme_path": config.html_theme_path,
+        "breathe_projects": getattr(config, "breathe_projects", None),
+        "doxygen_xml": (
+            doxygen_xml_digest(app)
+            if getattr(config, "breathe_projects", None)
+            else None
+        ),
+        "conf_py": conf_py_digest(app),
+        "fragment_transforms_allow": getattr(
+            config, "fragment_transforms_allow", None
+        ),
+        "fragment_transforms_deny": getattr(
+            config, "fragment_transforms_deny", None
+        ),
+        "target_index": (
+            target_index.digest if target_index is not None else None
+        ),
+        "sphinx": sphinx.__version__,
+        "docutils": docutils.__version__,
+    }
+    dump = json.dumps(fingerprint, sort_keys=True, default=repr)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
+class FragmentCache:
+    """Two-tier cache of rendered HTML fragments.
+
+    Entries are addressed by a hash of the RST source and the configuration
+    fingerprint. The memory tier is an LRU bounded by the total length of
+    the cached HTML. The optional disk tier stores one file per entry in a
+    directory sharded by the first two hex digits of the key; when it grows
+    over disk_max_bytes the least recently used files are removed.
+
+    With binary, the cached values are bytes instead of HTML text, and the
+    files are named after suffix.
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        cache_dir: Optional[str] = None,
+        disk_max_bytes: int = 1024 * 1024 * 1024,
+        binary: bool = False,
+        suffix: str = ".html",
+    ) -> None:
+        self.fingerprint = fingerprint
+        self.memory_max_bytes = memory_max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.binary = binary
+        self.suffix = suffix
+
+        self.memory: "OrderedDict[str, AnyStr]" = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            for path_to_entry in self._disk_entries():
+                self.disk_bytes += os.path.getsize(path_to_entry)
+
+    def key(self, rst: str) -> str:
+        digest = hashlib.sha256(self.fingerprint.encode("utf-8"))
+        digest.update(rst.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, rst: str) -> Optional[AnyStr]:
+        key = self.key(rst)
+
+        html = self.memory.get(key)
+        if html is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return html
+
+        if self.cache_dir is not None:
+            path_to_entry = self._disk_path(key)
+            try:
+                if self.binary:
+                    with open(path_to_entry, "rb") as file:
+                        html = file.read()
+                else:
+                    with open(path_to_entry, encoding="utf-8") as file:
+                        html = file.read()
+            except FileNotFoundError:
+                pass
+            else:
+                # The modification time doubles as the LRU timestamp.
+                os.utime(path_to_entry)
+                self._remember(key, html)
+                self.disk_hits += 1
+                return html
+
+        self.misses += 1
+        return None
+
+    def put(self, rst: str, html: AnyStr) -> None:
+        key = self.key(rst)
+        self._remember(key, html)
+
+        if self.cache_dir is None:
+            return
+        path_to_entry = self._disk_path(key)
+        if os.path.exists(path_to_entry):
+            return
+        os.makedirs(os.path.dirname(path_to_entry), exist_ok=True)
+        path_to_tmp = f"{path_to_entry}.{os.getpid()}.tmp"
+        if self.binary:
+            with open(path_to_tmp, "wb") as file:
+                file.write(html)
+        else:
+            with open(path_to_tmp, "w", encoding="utf-8") as file:
+                file.write(html)
+        os.replace(path_to_tmp, path_to_entry)
+        self.disk_bytes += os.path.getsize(path_to_entry)
+        if self.disk_bytes > self.disk_max_bytes:
+            self._evict_disk()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.memory_hits + self.disk_hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "disk_bytes": self.disk_bytes,
+        }
+
+    def _remember(self, key: str, html: AnyStr) -> None:
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return
+        self.memory[key] = html
+        self.memory_bytes += len(html)
+        while self.memory_bytes > self.memory_max_bytes and self.memory:
+            _, evicted_html = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted_html)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}{self.suffix}")
+
+    def _disk_entries(self):
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(self.suffix):
+                    yield entry.path
+
+    def _evict_disk(self) -> None:
+        # Shrink to 90% of the limit so that eviction does not run again on
+        # the very next put().
+        target_bytes = self.disk_max_bytes * 0.9
+        entries = sorted(self._disk_entries(), key=os.path.getmtime)
+        for path_to_entry in entries:
+            if self.disk_bytes <= target_bytes:
+                break
+            self.disk_bytes -= os.path.getsize(path_to_entry)
+            os.unlink(path_to_entry)
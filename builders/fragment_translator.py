@@ -0,0 +1,126 @@
+from typing import Callable, Dict, Optional
+
+from docutils import nodes
+from sphinx.writers.html5 import HTML5Translator
+
+# The output of HTMLTranslator.attval() for these class names is the class
+# names themselves.
+_PLAIN_CLASS_NAME = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_ "
+)
+
+
+class FragmentTranslator(HTML5Translator):
+    """HTML5Translator with fast paths for what fragments mostly consist of.
+
+    - walk() traverses the doctree like Node.walkabout(), without
+      formatting two debug messages per node, and dispatch_visit() and
+      dispatch_departure() look up the method for a node class only once.
+    - starttag() builds tags without ids, without classes on the node and
+      with at most a plain class attribute directly, which covers
+      paragraphs, emphasis, inline literals and list items.
+    - visit_Text() skips Text.astext() for text without escaped
+      characters.
+
+    Anything else is left to HTML5Translator, and the output is identical.
+    """
+
+    def __init__(self, document: nodes.document, builder) -> None:
+        super().__init__(document, builder)
+        self.visit_methods: Dict[type, Optional[Callable]] = {}
+        self.depart_methods: Dict[type, Optional[Callable]] = {}
+
+    def walk(self, node: nodes.Node) -> bool:
+        """Node.walkabout(self), for the whole tree."""
+        call_depart = True
+        stop = False
+        try:
+            try:
+                self.dispatch_visit(node)
+            except nodes.SkipNode:
+                return stop
+            except nodes.SkipDeparture:
+                call_depart = False
+            try:
+                for child in node.children[:]:
+                    if self.walk(child):
+                        stop = True
+                        break
+            except nodes.SkipSiblings:
+                pass
+        except nodes.SkipChildren:
+            pass
+        except nodes.StopTraversal:
+            stop = True
+        if call_depart:
+            self.dispatch_departure(node)
+        return stop
+
+    def _find_method(self, prefix: str, node_class: type) -> Optional[Callable]:
+        # Like SphinxTranslator.dispatch_visit(): the method for the most
+        # specific class in the MRO, including the handlers that Sphinx
+        # sets on the instance for custom nodes.
+        for base in node_class.__mro__:
+            method = getattr(self, prefix + base.__name__, None)
+            if method:
+                return method
+        return None
+
+    def dispatch_visit(self, node: nodes.Node) -> None:
+        node_class = node.__class__
+        try:
+            method = self.visit_methods[node_class]
+        except KeyError:
+            method = self._find_method("visit_", node_class)
+            self.visit_methods[node_class] = method
+        if method is None:
+            super().dispatch_visit(node)
+        else:
+            method(node)
+
+    def dispatch_departure(self, node: nodes.Node) -> None:
+        node_class = node.__class__
+        try:
+            method = self.depart_methods[node_class]
+        except KeyError:
+            method = self._find_method("depart_", node_class)
+            self.depart_methods[node_class] = method
+        if method is None:
+            super().dispatch_departure(node)
+        else:
+            method(node)
+
+    def starttag(self, node, tagname, suffix="\n", empty=False, **attributes):
+        if empty or node.get("ids") or node.get("classes"):
+            return super().starttag(
+                node, tagname, suffix, empty, **attributes
+            )
+        if not attributes:
+            return f"<{tagname.lower()}>{suffix}"
+        if len(attributes) != 1 or isinstance(node, nodes.table):
+            return super().starttag(
+                node, tagname, suffix, empty, **attributes
+            )
+        ((name, value),) = attributes.items()
+        if name.lower() != "class" or not isinstance(value, str):
+            return super().starttag(
+                node, tagname, suffix, empty, **attributes
+            )
+        classes = value.split()
+        if (
+            not _PLAIN_CLASS_NAME.issuperset(value)
+            or len(set(classes)) != len(classes)
+            or any(cls.startswith("language-") for cls in classes)
+        ):
+            return super().starttag(
+                node, tagname, suffix, empty, **attributes
+            )
+        if not classes:
+            return f"<{tagname.lower()}>{suffix}"
+        return f'<{tagname.lower()} class="{" ".join(classes)}">{suffix}'
+
+    def visit_Text(self, node: nodes.Text) -> None:
+        if self.protect_literal_text or self.in_mailto or "\x00" in node:
+            super().visit_Text(node)
+            return
+        self.body.append(node.translate(self.special_characters))
@@ -0,0 +1,121 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import pygments
+import sphinx
+from pygments.formatter import Formatter
+from pygments.lexer import Lexer
+from pygments.lexers import TextLexer
+from sphinx.highlighting import PygmentsBridge, lexers
+
+from builders.fragment_cache import FragmentCache
+
+# The names for which PygmentsBridge.get_lexer() returns a TextLexer
+# without falling back to it.
+TEXT_LEXER_NAMES = {"none", *TextLexer.aliases}
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=repr)
+
+
+def highlighter_fingerprint(highlighter: PygmentsBridge) -> str:
+    """Hash everything besides the code and its options that changes the
+    highlighted HTML."""
+    fingerprint = {
+        "dest": highlighter.dest,
+        "latex_engine": highlighter.latex_engine,
+        "formatter": highlighter.formatter,
+        "formatter_args": highlighter.formatter_args,
+        # Lexers added with app.add_lexer().
+        "lexers": sorted(f"{name}={lexer!r}" for name, lexer in lexers.items()),
+        "pygments": pygments.__version__,
+        "sphinx": sphinx.__version__,
+    }
+    dump = _dump(fingerprint)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
+class CachingPygmentsBridge(PygmentsBridge):
+    """PygmentsBridge that reuses highlighted code blocks.
+
+    The highlighted code is stored in a FragmentCache under the language,
+    the source, the lexer and formatter options and a fingerprint of the
+    Pygments version and style, so with a cache_dir it is reused across
+    runs. Lexer and formatter instances are reused for the same options
+    instead of being created, and the formatter's stylesheet compiled, for
+    every block. Code that Pygments could not lex, or for which it has no
+    lexer, is not cached, so that the warning about it is logged on every
+    build.
+    """
+
+    def __init__(
+        self, highlighter: PygmentsBridge, cache: Optional[FragmentCache] = None
+    ) -> None:
+        # Takes over the style and destination of the builder's highlighter.
+        self.__dict__.update(highlighter.__dict__)
+        if cache is None:
+            cache = FragmentCache(highlighter_fingerprint(highlighter))
+        self.cache = cache
+        self.lexers: Dict[Tuple[str, str, bool, bool], Lexer] = {}
+        self.formatters: Dict[str, Formatter] = {}
+        # Set by get_lexer() while super().highlight_block() runs.
+        self.lexer_requests = 0
+        self.unknown_lexer = False
+
+    def get_formatter(self, **kwargs: Any) -> Formatter:
+        key = _dump(kwargs)
+        formatter = self.formatters.get(key)
+        if formatter is None:
+            formatter = super().get_formatter(**kwargs)
+            self.formatters[key] = formatter
+        return formatter
+
+    def get_lexer(self, source: str, lang: str, opts: Optional[dict] = None,
+                  force: bool = False, location: Any = None) -> Lexer:
+        self.lexer_requests += 1
+        # super() picks the console lexer for Python sessions.
+        key = (lang, _dump(opts or {}), force, source.startswith(">>>"))
+        lexer = self.lexers.get(key)
+        if lexer is not None:
+            return lexer
+
+        lexer = super().get_lexer(source, lang, opts, force, location)
+        # super() falls back to the "none" lexer, and warns, for a name
+        # that Pygments does not know.
+        if type(lexer) is TextLexer and lang not in TEXT_LEXER_NAMES:
+            self.unknown_lexer = True
+        # A guessed lexer depends on the source, and an unknown name is
+        # warned about every time.
+        elif lang != "guess":
+            self.lexers[key] = lexer
+        return lexer
+
+    def highlight_block(self, source: str, lang: str, opts: Optional[dict] = None,
+                        force: bool = False, location: Any = None, **kwargs: Any) -> str:
+        if not isinstance(source, str):
+            source = source.decode()
+
+        cache_key = f"{_dump([lang, opts or {}, force, kwargs])}\n{source}"
+        hlsource = self.cache.get(cache_key)
+        if hlsource is not None:
+            return hlsource
+
+        self.lexer_requests = 0
+        self.unknown_lexer = False
+        hlsource = super().highlight_block(
+            source, lang, opts, force, location, **kwargs
+        )
+        # super() asks for a second lexer, and warns, when it could not lex
+        # the code with the first one.
+        if self.lexer_requests == 1 and not self.unknown_lexer:
+            self.cache.put(cache_key, hlsource)
+        return hlsource
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.cache.stats(),
+            "lexers": len(self.lexers),
+            "formatters": len(self.formatters),
+        }
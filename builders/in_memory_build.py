@@ -0,0 +1,270 @@
+import builtins
+import contextlib
+import errno
+import importlib
+import io
+import os
+import posixpath
+from os import path
+from typing import Any, Dict, Iterator, Optional
+
+from docutils.utils import relative_path
+from sphinx.environment import BuildEnvironment
+from sphinx.util import fileutil, osutil
+
+# The module globals through which the builders and the environment open,
+# create and copy the files of a build, as of Sphinx 5.3 to 7.4.
+REDIRECTED_NAMES = {
+    "sphinx.builders": ("open", "ensuredir"),
+    "sphinx.builders.html": ("open", "ensuredir", "copyfile", "copy_asset"),
+    "sphinx.environment": ("open",),
+    "sphinx.util.inventory": ("open",),
+}
+
+MISSING = object()
+
+
+class StoredFile(io.BytesIO):
+    """A file opened for writing, which is stored when it is closed."""
+
+    def __init__(self, store: "VirtualStore", filename: str) -> None:
+        super().__init__()
+        self.store = store
+        self.filename = filename
+
+    def close(self) -> None:
+        if not self.closed:
+            self.store.write(self.filename, self.getvalue())
+        super().close()
+
+
+class VirtualStore:
+    """Stands in for the output and doctree directories of a build.
+
+    Files are kept as bytes under the absolute path that the builder would
+    have written them to.
+    """
+
+    def __init__(self, *directories: str) -> None:
+        self.directories = tuple(
+            path.abspath(os.fspath(directory)) for directory in directories
+        )
+        self.files: Dict[str, bytes] = {}
+
+    def __contains__(self, filename: str) -> bool:
+        return path.abspath(os.fspath(filename)) in self.files
+
+    def is_stored(self, filename: str) -> bool:
+        """Whether filename is under one of the directories of the store."""
+        filename = path.abspath(os.fspath(filename))
+        return any(
+            filename == directory or filename.startswith(directory + os.sep)
+            for directory in self.directories
+        )
+
+    def write(self, filename: str, data: bytes) -> None:
+        self.files[path.abspath(os.fspath(filename))] = data
+
+    def read(self, filename: str) -> bytes:
+        return self.files[path.abspath(os.fspath(filename))]
+
+    def copy_file(self, source: str, destination: str) -> None:
+        with open(source, "rb") as file:
+            self.write(destination, file.read())
+
+    def copy_asset(
+        self,
+        source: str,
+        destination: str,
+        excluded=lambda path: False,
+        context: Optional[dict] = None,
+        renderer=None,
+    ) -> None:
+        """Like sphinx.util.fileutil.copy_asset(), into the store."""
+        if not path.exists(source):
+            return
+        if path.isfile(source):
+            self._copy_asset_file(
+                source,
+                path.join(destination, path.basename(source)),
+                context,
+                renderer,
+            )
+            return
+
+        for root, dirs, files in os.walk(source, followlinks=True):
+            reldir = relative_path(source, root)
+            dirs[:] = [
+                name
+                for name in dirs
+                if not excluded(posixpath.join(reldir, name))
+            ]
+            for filename in files:
+                if not excluded(posixpath.join(reldir, filename)):
+                    self._copy_asset_file(
+                        posixpath.join(root, filename),
+                        path.normpath(
+                            posixpath.join(destination, reldir, filename)
+                        ),
+                        context,
+                        renderer,
+                    )
+
+    def _copy_asset_file(
+        self, source: str, destination: str, context, renderer
+    ) -> None:
+        if source.lower().endswith("_t") and context is not None:
+            with open(source, encoding="utf-8") as file:
+                rendered = renderer.render_string(file.read(), context)
+            self.write(destination[:-2], rendered.encode("utf-8"))
+        else:
+            self.copy_file(source, destination)
+
+    def _open(
+        self,
+        file,
+        mode: str = "r",
+        *args: Any,
+        encoding: Optional[str] = None,
+        errors: Optional[str] = None,
+        newline: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        if not self.is_stored(file):
+            return builtins.open(
+                file,
+                mode,
+                *args,
+                encoding=encoding,
+                errors=errors,
+                newline=newline,
+                **kwargs,
+            )
+        # Files are always written whole.
+        if "r" in mode and "+" not in mode:
+            try:
+                binary = io.BytesIO(self.read(file))
+            except KeyError:
+                raise FileNotFoundError(
+                    errno.ENOENT, os.strerror(errno.ENOENT), os.fspath(file)
+                ) from None
+        else:
+            binary = StoredFile(self, file)
+        if "b" in mode:
+            return binary
+        return io.TextIOWrapper(
+            binary, encoding=encoding or "utf-8", errors=errors, newline=newline
+        )
+
+    def _ensuredir(self, directory: str) -> None:
+        if not self.is_stored(directory):
+            osutil.ensuredir(directory)
+
+    def _copyfile(self, source: str, destination: str, **kwargs: Any) -> None:
+        if self.is_stored(destination):
+            self.copy_file(source, destination)
+        else:
+            osutil.copyfile(source, destination, **kwargs)
+
+    def _copy_asset(
+        self,
+        source: str,
+        destination: str,
+        excluded=lambda path: False,
+        context: Optional[dict] = None,
+        renderer=None,
+        **kwargs: Any,
+    ) -> None:
+        if self.is_stored(destination):
+            self.copy_asset(source, destination, excluded, context, renderer)
+        else:
+            fileutil.copy_asset(
+                source, destination, excluded, context, renderer, **kwargs
+            )
+
+    @contextlib.contextmanager
+    def redirected(self) -> Iterator[None]:
+        """Make Sphinx open, create and copy the files under the directories
+        of the store in the store, see REDIRECTED_NAMES."""
+        replacements = {
+            "open": self._open,
+            "ensuredir": self._ensuredir,
+            "copyfile": self._copyfile,
+            "copy_asset": self._copy_asset,
+        }
+        originals = []
+        for module_name, names in REDIRECTED_NAMES.items():
+            module = importlib.import_module(module_name)
+            # Sphinx 5 replaces the modules with deprecated names by a
+            # wrapper, but their functions still use the module's globals.
+            module = getattr(module, "_module", module)
+            for name in names:
+                original = vars(module).get(name, MISSING)
+                originals.append((module, name, original))
+                setattr(module, name, replacements[name])
+        try:
+            yield
+        finally:
+            for module, name, original in reversed(originals):
+                if original is MISSING:
+                    delattr(module, name)
+                else:
+                    setattr(module, name, original)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": len(self.files),
+            "bytes": sum(len(data) for data in self.files.values()),
+        }
+
+
+class InMemoryBuildMixin:
+    """Makes an HTML builder keep its doctrees, environment pickle, pages and
+    assets in a VirtualStore instead of writing them to disk.
+
+    The Sphinx methods run unchanged: a build redirects what they write
+    under outdir and doctreedir to the store. The static assets depend only
+    on the configuration and are stored by the first build.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.virtual_store = VirtualStore(self.outdir, self.doctreedir)
+        self.static_files_stored = False
+        # Filled in the workers of a parallel read, which send back only
+        # their environment, see merge_doctrees().
+        self.env.virtual_doctrees = {}
+        self.main_pid = os.getpid()
+        self.app.connect("env-merge-info", self.merge_doctrees)
+
+    def build(self, *args: Any, **kwargs: Any) -> None:
+        with self.virtual_store.redirected():
+            super().build(*args, **kwargs)
+
+    def read_doc(self, docname: str, **kwargs: Any) -> None:
+        super().read_doc(docname, **kwargs)
+        if os.getpid() != self.main_pid:
+            self.env.virtual_doctrees[docname] = self.virtual_store.read(
+                path.join(self.doctreedir, docname + ".doctree")
+            )
+
+    def merge_doctrees(
+        self, app, env: BuildEnvironment, docnames, other: BuildEnvironment
+    ) -> None:
+        for docname, serialised in other.virtual_doctrees.items():
+            self.virtual_store.write(
+                path.join(self.doctreedir, docname + ".doctree"), serialised
+            )
+
+    def copy_static_files(self) -> None:
+        if not self.static_files_stored:
+            super().copy_static_files()
+            self.static_files_stored = True
+
+
+def in_memory_builder_class(builder_class: type) -> type:
+    return type(
+        f"InMemory{builder_class.__name__}",
+        (InMemoryBuildMixin, builder_class),
+        {},
+    )
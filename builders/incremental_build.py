@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Dict, List, Optional, Set
+
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+
+from builders.block_render import DIRECTIVE
+from builders.doxygen_directive_cache import DOXYGEN_DIRECTIVES
+from builders.doxygen_index import doxygen_xml_files
+
+# Stored in doctreedir next to the environment pickle.
+HASHES_FILENAME = "content_hashes.json"
+OUTPUTS_FILENAME = "outputs.pickle"
+
+
+def file_digest(path_to_file: str) -> Optional[str]:
+    try:
+        with open(path_to_file, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class IncrementalBuild:
+    """Decides which documents to read again by the content of their files
+    instead of by modification times.
+
+    Sphinx reads a document again when its source or a file it depends on,
+    such as an included file, is newer than the last read. That misses
+    files that a CI cache restore gives an older time, and reads every file
+    that a git checkout touched. Instead, on env-get-outdated, the SHA-256
+    digests of the source, of its dependencies and, for documents with a
+    doxygen directive, of the Doxygen XML are compared with those that the
+    last build stored in doctreedir. The documents that Sphinx found
+    changed are replaced by those for which a digest differs. Added and
+    removed documents, configuration changes and documents without a
+    doctree are left to Sphinx.
+
+    With the per-document mode of SingleFileHTMLBuilderWithoutFinish, the
+    HTML of the documents is stored as well, so only the documents that
+    were read again are written.
+    """
+
+    def __init__(self, app: Sphinx) -> None:
+        self.app = app
+        self.path_to_hashes = os.path.join(app.doctreedir, HASHES_FILENAME)
+        self.path_to_outputs = os.path.join(app.doctreedir, OUTPUTS_FILENAME)
+        self.records: Dict[str, dict] = {}
+        # Digests by path, computed once per build.
+        self.digests: Dict[str, Optional[str]] = {}
+        self.xml_digest: Optional[str] = None
+
+        self.documents_outdated = 0
+        self.documents_unchanged = 0
+        self.documents_touched = 0
+
+    def load(self) -> None:
+        try:
+            with open(self.path_to_hashes, encoding="utf-8") as file:
+                self.records = json.load(file)
+        except FileNotFoundError:
+            self.records = {}
+        if self.stores_outputs():
+            try:
+                with open(self.path_to_outputs, "rb") as file:
+                    self.app.builder.outputs = pickle.load(file)
+            except FileNotFoundError:
+                pass
+
+    def save(self) -> None:
+        env = self.app.env
+        records = {
+            docname: self.record(env, docname)
+            for docname in sorted(env.found_docs)
+        }
+        self._write(self.path_to_hashes, json.dumps(records).encode())
+        self.records = records
+        if self.stores_outputs():
+            outputs = {
+                docname: body
+                for docname, body in self.app.builder.outputs.items()
+                if docname in env.found_docs
+            }
+            self._write(
+                self.path_to_outputs,
+                pickle.dumps(outputs, pickle.HIGHEST_PROTOCOL),
+            )
+        self.digests.clear()
+        self.xml_digest = None
+
+    def stores_outputs(self) -> bool:
+        return getattr(self.app.builder, "per_document", False)
+
+    @staticmethod
+    def _write(path_to_file: str, data: bytes) -> None:
+        path_to_tmp = f"{path_to_file}.{os.getpid()}.tmp"
+        with open(path_to_tmp, "wb") as file:
+            file.write(data)
+        os.replace(path_to_tmp, path_to_file)
+
+    def digest(self, path_to_file: str) -> Optional[str]:
+        if path_to_file not in self.digests:
+            self.digests[path_to_file] = file_digest(path_to_file)
+        return self.digests[path_to_file]
+
+    def get_xml_digest(self) -> str:
+        if self.xml_digest is None:
+            digest = hashlib.sha256()
+            for path_to_file in sorted(doxygen_xml_files(self.app)):
+                entry = f"{path_to_file}\0{self.digest(path_to_file)}\0"
+                digest.update(entry.encode("utf-8"))
+            self.xml_digest = digest.hexdigest()
+        return self.xml_digest
+
+    def record(self, env: BuildEnvironment, docname: str) -> dict:
+        """The digests that docname was read from."""
+        path_to_source = env.doc2path(docname)
+        dependencies = {
+            dependency: self.digest(os.path.join(env.srcdir, dependency))
+            for dependency in sorted(env.dependencies.get(docname, ()))
+        }
+        record = {
+            "source": self.digest(path_to_source),
+            "dependencies": dependencies,
+            "doxygen": None,
+        }
+        try:
+            with open(path_to_source, encoding="utf-8") as file:
+                names = DIRECTIVE.findall(file.read())
+        except (OSError, UnicodeDecodeError):
+            names = []
+        if any(name in DOXYGEN_DIRECTIVES for name in names):
+            record["doxygen"] = self.get_xml_digest()
+        return record
+
+    def get_outdated(
+        self,
+        app: Sphinx,
+        env: BuildEnvironment,
+        added: Set[str],
+        changed: Set[str],
+        removed: Set[str],
+    ) -> List[str]:
+        kept = set()
+        outdated = set()
+        for docname in sorted(env.found_docs - added - removed):
+            path_to_doctree = os.path.join(
+                env.doctreedir, docname + ".doctree"
+            )
+            if docname in env.reread_always or not os.path.isfile(
+                path_to_doctree
+            ):
+                # Sphinx has its own reasons to read these again.
+                if docname in changed:
+                    kept.add(docname)
+                continue
+            if self.record(env, docname) != self.records.get(docname):
+                outdated.add(docname)
+            elif docname in changed:
+                self.documents_touched += 1
+        self.documents_outdated += len(outdated)
+        self.documents_unchanged += (
+            len(env.found_docs - added - removed) - len(kept | outdated)
+        )
+        # Builder.read() goes on with this very set.
+        changed.clear()
+        changed.update(kept | outdated)
+        return []
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "documents": len(self.records),
+            "documents_outdated": self.documents_outdated,
+            "documents_unchanged": self.documents_unchanged,
+            "documents_touched": self.documents_touched,
+        }
+
+
+def install_incremental_build(app: Sphinx) -> IncrementalBuild:
+    incremental_build = IncrementalBuild(app)
+    incremental_build.load()
+
+    def save(app: Sphinx, exception: Optional[Exception]) -> None:
+        if exception is None:
+            incremental_build.save()
+
+    app.connect("env-get-outdated", incremental_build.get_outdated)
+    app.connect("build-finished", save)
+    return incremental_build
@@ -0,0 +1,111 @@
+import contextlib
+import sys
+import tracemalloc
+from typing import List, Optional
+
+# Returned instead of a measuring context when no report is installed.
+NO_MEASUREMENT = contextlib.nullcontext()
+
+
+class FragmentMemory:
+    __slots__ = ("index", "input_chars", "peak_bytes", "retained_bytes")
+
+    def __init__(self, index: int, input_chars: int) -> None:
+        self.index = index
+        self.input_chars = input_chars
+        self.peak_bytes = 0
+        self.retained_bytes = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "input_chars": self.input_chars,
+            "peak_bytes": self.peak_bytes,
+            "retained_bytes": self.retained_bytes,
+        }
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """The peak resident set size of the process, None where the resource
+    module is not available, that is on Windows."""
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class MemoryReport:
+    """Peak memory allocated while each fragment is rendered.
+
+    The numbers come from tracemalloc and are relative to the memory in use
+    when the fragment starts, so they are what a fragment adds on top of
+    the warm app. Tracing slows rendering down several times, so the
+    report is meant for sizing worker memory limits, not for production.
+    """
+
+    def __init__(self) -> None:
+        self.fragments: List[FragmentMemory] = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def measure(self, rst: str):
+        record = FragmentMemory(len(self.fragments), len(rst))
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        else:
+            # Python < 3.9: clearing the traces resets the peak too, and
+            # the numbers below stay relative to the start.
+            tracemalloc.clear_traces()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            record.peak_bytes = peak_bytes - start_bytes
+            record.retained_bytes = current_bytes - start_bytes
+            self.fragments.append(record)
+
+    def stats(self) -> dict:
+        peaks = [record.peak_bytes for record in self.fragments]
+        return {
+            "fragments": len(self.fragments),
+            "max_peak_bytes": max(peaks, default=0),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "per_fragment": [record.as_dict() for record in self.fragments],
+        }
+
+    def format_table(self, limit: int = 10) -> str:
+        """The fragments with the highest peaks, highest first."""
+        lines = [
+            f"{'fragment':>8}  {'input chars':>12}  {'peak KiB':>10}  "
+            f"{'retained KiB':>12}"
+        ]
+        records = sorted(self.fragments, key=lambda record: -record.peak_bytes)
+        for record in records[:limit]:
+            lines.append(
+                f"{record.index:>8}  {record.input_chars:>12}  "
+                f"{record.peak_bytes / 1024:>10.1f}  "
+                f"{record.retained_bytes / 1024:>12.1f}"
+            )
+        peak_rss = peak_rss_bytes()
+        lines.append(
+            f"{len(self.fragments)} fragments, process peak RSS "
+            + (f"{peak_rss / 1024:.1f} KiB" if peak_rss is not None else "n/a")
+        )
+        return "\n".join(lines)
+
+
+class MemoryReportMixin:
+    """Lets a builder measure its fragments when a MemoryReport is
+    installed."""
+
+    memory_report = None
+
+    def measured(self, rst: str):
+        if self.memory_report is None:
+            return NO_MEASUREMENT
+        return self.memory_report.measure(rst)
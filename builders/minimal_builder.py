@@ -7,20 +7,41 @@ from typing import Any, Iterable, Optional, Sequence, List
 import docutils
 from docutils import nodes
 from docutils.core import Publisher
-from docutils.frontend import OptionParser
 from docutils.io import StringOutput, NullOutput
 from docutils.utils import DependencyList
 from sphinx.application import Sphinx
 from sphinx.builders.html import StandaloneHTMLBuilder
 from sphinx.builders.singlehtml import SingleFileHTMLBuilder
 from sphinx.environment import BuildEnvironment
-from sphinx.io import SphinxStandaloneReader, SphinxDummyWriter, SphinxFileInput
+from sphinx.io import SphinxDummyWriter, SphinxFileInput
 from sphinx.util import relative_uri, rst, get_filetype, UnicodeDecodeErrorHandler
 from sphinx.util.console import darkgreen  # type: ignore
 from sphinx.util.docutils import sphinx_domains
 from sphinx.util.nodes import inline_all_toctrees
 from sphinx.util.parallel import SerialTasks
-from sphinx.writers.html import HTMLWriter
+
+from builders.block_render import BlockRenderer
+from builders.coalesce import FragmentCoalescer
+from builders.doctree_cache import DoctreeCache
+from builders.fragment_cache import (
+    FragmentCache,
+    config_fingerprint,
+    reads_other_files,
+)
+from builders.fragment_translator import FragmentTranslator
+from builders.memory_report import MemoryReportMixin
+from builders.phase_timer import PhaseTimingMixin
+from builders.render_context import RenderContext
+from builders.transform_profile import (
+    FragmentReader,
+    TransformProfile,
+    find_env_collectors,
+)
+
+
+# How long the configuration fingerprint is reused before conf.py and the
+# Doxygen XML are checked for changes again.
+FINGERPRINT_REFRESH_INTERVAL = 1.0
 
 
 class MyRSTInputReader:
@@ -34,7 +55,9 @@ class MyRSTInputReader:
         pass
 
 
-class MinimalBuilder(StandaloneHTMLBuilder):
+class MinimalBuilder(
+    PhaseTimingMixin, MemoryReportMixin, StandaloneHTMLBuilder
+):
     name = 'minimal'
     format = 'custom'
 
@@ -47,14 +70,56 @@ class MinimalBuilder(StandaloneHTMLBuilder):
         self.output = None
         self.strictdoc_input = None
         self.strictdoc_output = None
+        self.fragment_cache: Optional[FragmentCache] = None
+        self.block_renderer: Optional[BlockRenderer] = None
+        self.doctree_cache: Optional[DoctreeCache] = None
+        self.coalescer = FragmentCoalescer(self)
+        # Release every doctree and the writer state right after the
+        # document is written, see release_doctree().
+        self.low_memory = False
+        # Write with the FragmentTranslator instead of HTML5Translator.
+        self.fast_translator = False
+        self.render_context: Optional[RenderContext] = None
+        # See get_fingerprint().
+        self.fingerprint: Optional[str] = None
+        self.fingerprint_time = 0.0
+        self.fingerprint_index_digest: Optional[str] = None
+        self.transform_profile: Optional[TransformProfile] = None
+        self.env_collectors = find_env_collectors(app)
+
+    @property
+    def default_translator_class(self):
+        if self.fast_translator:
+            return FragmentTranslator
+        return super().default_translator_class
 
     def build(
         self, docnames: Iterable[str], summary: Optional[str] = None, method: str = 'update'
     ) -> None:
-        self.read()
-
-        # write all "normal" documents (or everything for some builders)
-        self.write(docnames, list(), method)
+        cached_output = self.get_cached_output(self.strictdoc_input)
+        if cached_output is not None:
+            self.strictdoc_output = cached_output
+            return
+
+        with self.measured(self.strictdoc_input):
+            if self.block_renderer is not None:
+                self.prepare_writing(self.env.all_docs)
+                fragment = self.strictdoc_input
+                self.strictdoc_output = self.block_renderer.render(fragment)
+                self.strictdoc_input = fragment
+            else:
+                self.read()
+
+                # write all "normal" documents (or everything for some
+                # builders)
+                self.write(docnames, list(), method)
+
+        self.put_cached_output(self.strictdoc_input, self.strictdoc_output)
+
+    def get_outdated_docs(self):
+        # The fragment is rendered on every build, so there is no need to
+        # compare .buildinfo and output file times on disk.
+        return "all documents"
 
     def read(self) -> List[str]:
         """(Re-)read all files new or changed since last update.
@@ -69,9 +134,8 @@ class MinimalBuilder(StandaloneHTMLBuilder):
     def _read_serial(self, docnames: List[str]) -> None:
         self.read_doc("index")
 
-    @staticmethod
-    def create_publisher(app: "Sphinx", filetype: str) -> Publisher:
-        reader = SphinxStandaloneReader()
+    def create_publisher(self, app: "Sphinx", filetype: str) -> Publisher:
+        reader = FragmentReader(self.transform_profile, self)
         reader.setup(app)
 
         parser = app.registry.create_source_parser(app, filetype)
@@ -91,12 +155,22 @@ class MinimalBuilder(StandaloneHTMLBuilder):
 
     def read_doc(self, docname: str) -> None:
         # super().read_doc(docname)
+        if self.doctree_cache is not None:
+            doctree = self.doctree_cache.read(
+                docname, self.strictdoc_input, self.parse_doc
+            )
+        else:
+            doctree = self.parse_doc(docname)
+        self.write_doctree(docname, doctree)
 
+    def parse_doc(self, docname: str) -> nodes.document:
         """Parse a file and add/update inventory entries for the doctree."""
         self.env.prepare_settings(docname)
 
         filename = self.env.doc2path(docname)
-        publisher = MinimalBuilder.create_publisher(self.app, "restructuredtext")
+        render_context = self.get_render_context()
+        render_context.reset()
+        publisher = render_context.publisher
 
         with sphinx_domains(self.env), rst.default_role(docname, self.config.default_role):
             # set up error_handler for the target document
@@ -106,14 +180,21 @@ class MinimalBuilder(StandaloneHTMLBuilder):
             publisher.set_source(
                 source=my_rst_input_reader, source_path=filename
             )
-            publisher.publish()
+            # What publisher.publish() does, minus the dummy writer, with
+            # parsing and transforms timed separately.
+            with self.timed(docname, "parse"):
+                publisher.document = publisher.reader.read(
+                    publisher.source, publisher.parser, publisher.settings
+                )
+            with self.timed(docname, "transforms"):
+                publisher.apply_transforms()
             doctree = publisher.document
 
         # cleanup
         self.env.temp_data.clear()
         self.env.ref_context.clear()
 
-        self.write_doctree(docname, doctree)
+        return doctree
 
     def write(self, build_docnames: Iterable[str], updated_docnames: Sequence[str], method: str = 'update') -> None:  # NOQA
         # super().write(build_docnames, updated_docnames, method)
@@ -124,10 +205,24 @@ class MinimalBuilder(StandaloneHTMLBuilder):
         # with progress_message(__('assembling single document')):
         # doctree = self.assemble_doctree()
         master = self.config.root_doc
+        self.write_fragment(master)
+
+        # docnames.add(self.config.root_doc)
+        #
+        # self.prepare_writing(docnames)
+        #
+        # for docname in docnames:
+        #     assert self.doctree is not None
+        #     doctree = self.doctree
+        #     # self.write_doc_serialized(docname, doctree)
+        #     self.write_doc(docname, doctree)
+
+    def write_fragment(self, master: str) -> None:
         tree = self.doctree
         # tree = inline_all_toctrees(self, set(), master, tree, darkgreen, [master])
         tree['docname'] = master
-        self.env.resolve_references(tree, master, self)
+        with self.timed(master, "resolve_references"):
+            self.env.resolve_references(tree, master, self)
         # self.fix_refuris(tree)
         doctree = tree
 
@@ -135,26 +230,152 @@ class MinimalBuilder(StandaloneHTMLBuilder):
         # self.env.toc_fignumbers = self.assemble_toc_fignumbers()
 
         # self.write_doc_serialized(self.config.root_doc, doctree)
-        self.write_doc(self.config.root_doc, doctree)
+        self.write_doc(master, doctree)
 
-        # docnames.add(self.config.root_doc)
-        #
-        # self.prepare_writing(docnames)
-        #
-        # for docname in docnames:
-        #     assert self.doctree is not None
-        #     doctree = self.doctree
-        #     # self.write_doc_serialized(docname, doctree)
-        #     self.write_doc(docname, doctree)
+        if self.low_memory:
+            self.release_doctree(doctree)
+
+    def render_many(
+        self, fragments: Iterable[str], batch_size: int = 1
+    ) -> List[str]:
+        """Render RST fragments to HTML fragments, in the input order.
+
+        Unlike app.build(), this skips Sphinx's build bookkeeping: the
+        environment, the HTML writer and its settings are shared by all
+        fragments and only per-document state is reset between them.
+
+        With a batch_size over 1, up to batch_size fragments at a time are
+        rendered as one document, see FragmentCoalescer. This is not done
+        for block rendering or while memory is reported, which both work
+        per fragment.
+        """
+        assert batch_size > 0
+        self.prepare_writing(self.env.all_docs)
+        coalesce = (
+            batch_size > 1
+            and self.block_renderer is None
+            and self.memory_report is None
+        )
+
+        outputs: List[Optional[str]] = []
+        # Indexes into outputs of the fragments waiting for a batch.
+        pending: List[int] = []
+        fragments = list(fragments)
+        for index, fragment in enumerate(fragments):
+            cached_output = self.get_cached_output(fragment)
+            if cached_output is not None:
+                outputs.append(cached_output)
+                continue
+
+            if coalesce and self.coalescer.can_coalesce(fragment):
+                outputs.append(None)
+                pending.append(index)
+                if len(pending) == batch_size:
+                    self._render_pending(fragments, pending, outputs)
+                continue
+
+            with self.measured(fragment):
+                if self.block_renderer is not None:
+                    output = self.block_renderer.render(fragment)
+                else:
+                    output = self.render_document(fragment)
+            outputs.append(output)
+            self.put_cached_output(fragment, output)
+        self._render_pending(fragments, pending, outputs)
+        return outputs
+
+    def _render_pending(
+        self,
+        fragments: List[str],
+        pending: List[int],
+        outputs: List[Optional[str]],
+    ) -> None:
+        batch = [fragments[index] for index in pending]
+        for index, output in zip(pending, self.coalescer.render_batch(batch)):
+            outputs[index] = output
+            self.put_cached_output(fragments[index], output)
+        pending.clear()
+
+    def get_cached_output(self, fragment: str) -> Optional[str]:
+        """The HTML of fragment from the fragment cache, if there is one.
+
+        Fragments that read other files are never cached: a change to those
+        files would not change the key.
+        """
+        if self.fragment_cache is None or reads_other_files(fragment):
+            return None
+        self.get_fingerprint()
+        return self.fragment_cache.get(fragment)
+
+    def put_cached_output(self, fragment: str, output: str) -> None:
+        if self.fragment_cache is None or reads_other_files(fragment):
+            return
+        self.fragment_cache.put(fragment, output)
+
+    def render_document(self, fragment: str) -> str:
+        """Render one fragment as the root document; prepare_writing() must
+        have been called."""
+        master = self.config.root_doc
+        self.strictdoc_input = fragment
+        try:
+            self.read_doc(master)
+            self.write_fragment(master)
+        finally:
+            # Also after a failure, so that the next fragment starts clean.
+            self.reset_document(master)
+        return self.strictdoc_output
+
+    def reset_document(self, docname: str) -> None:
+        # Drop whatever the previous fragment left behind so that, for
+        # example, its C declarations do not clash with the next fragment.
+        self.env.temp_data.clear()
+        self.env.ref_context.clear()
+        self.env.clear_doc(docname)
+        self.doctree = None
+
+    def get_fingerprint(self) -> str:
+        """config_fingerprint(), taken again when the target index has
+        changed and otherwise at most every FINGERPRINT_REFRESH_INTERVAL
+        seconds, instead of for every document. The fragment cache follows
+        it, so that it stops serving HTML of outdated Doxygen XML."""
+        target_index = getattr(self, "target_index", None)
+        index_digest = (
+            target_index.digest if target_index is not None else None
+        )
+        now = time.monotonic()
+        if (
+            self.fingerprint is None
+            or index_digest != self.fingerprint_index_digest
+            or now - self.fingerprint_time > FINGERPRINT_REFRESH_INTERVAL
+        ):
+            self.fingerprint = config_fingerprint(self.app)
+            self.fingerprint_time = now
+            self.fingerprint_index_digest = index_digest
+            if self.fragment_cache is not None:
+                self.fragment_cache.fingerprint = self.fingerprint
+        return self.fingerprint
+
+    def get_render_context(self) -> RenderContext:
+        fingerprint = self.get_fingerprint()
+        if (
+            self.render_context is None
+            or self.render_context.fingerprint != fingerprint
+        ):
+            self.transform_profile = TransformProfile.from_config(self.config)
+            self.transform_profile.configure_collectors(
+                self.app, self.env_collectors
+            )
+            self.render_context = RenderContext(self, fingerprint)
+        return self.render_context
 
     def prepare_writing(self, docnames):
         # super().prepare_writing(docnames)
 
-        self.docwriter = HTMLWriter(self)
-        self.docsettings: Any = OptionParser(
-            defaults=self.env.settings,
-            components=(self.docwriter,),
-            read_config_files=True).get_default_values()
+        # The writer and its settings are built once per configuration, see
+        # RenderContext.
+        render_context = self.get_render_context()
+        self.docwriter = render_context.docwriter
+        self.docsettings: Any = render_context.docsettings
 
     def write_doctree(self, docname: str, doctree: nodes.document) -> None:
         # WIP: Instead of writing doctree to pickle, we just store it to memory.
@@ -164,15 +385,31 @@ class MinimalBuilder(StandaloneHTMLBuilder):
         # super().write_doc(docname, doctree)
         destination = StringOutput(encoding='utf-8')
         doctree.settings = self.docsettings
-        #
-        # self.secnumbers = self.env.toc_secnumbers.get(docname, {})
-        # self.fignumbers = self.env.toc_fignumbers.get(docname, {})
+        # The HTML translator looks these up for every section title.
+        self.secnumbers = self.env.toc_secnumbers.get(docname, {})
+        self.fignumbers = self.env.toc_fignumbers.get(docname, {})
         # self.imgpath = relative_uri(self.get_target_uri(docname), '_images')
         # self.dlpath = relative_uri(self.get_target_uri(docname), '_downloads')
         self.current_docname = docname
         #
-        self.docwriter.write(doctree, destination)
-        self.docwriter.assemble_parts()
+        if self.low_memory or self.fast_translator:
+            # What docwriter.write() and assemble_parts() do, minus the
+            # whole page, the other parts and the encoded copy of the page,
+            # none of which is used and all of which the shared docwriter
+            # would keep alive until the next document.
+            with self.timed(docname, "write"):
+                visitor = self.create_translator(doctree, self)
+                if isinstance(visitor, FragmentTranslator):
+                    visitor.walk(doctree)
+                else:
+                    doctree.walkabout(visitor)
+            with self.timed(docname, "assemble_parts"):
+                self.strictdoc_output = "".join(visitor.fragment)
+            return
+        with self.timed(docname, "write"):
+            self.docwriter.write(doctree, destination)
+        with self.timed(docname, "assemble_parts"):
+            self.docwriter.assemble_parts()
         body = self.docwriter.parts['fragment']
         self.strictdoc_output = body
 
@@ -182,6 +419,24 @@ class MinimalBuilder(StandaloneHTMLBuilder):
         # ctx = self.get_doc_context(docname, body, metatags)
         # self.handle_page(docname, ctx, event_arg=doctree)
 
+    def release_doctree(self, doctree: nodes.document) -> None:
+        """Free the doctree and the source now rather than at the next
+        garbage collection."""
+        self.doctree = None
+        publisher = self.render_context.publisher
+        publisher.document = None
+        publisher.source = None
+        publisher.reader.document = None
+        publisher.reader.input = None
+        # Nodes refer to their parents, so an unreachable doctree is freed
+        # only by the cyclic garbage collector, possibly after the next
+        # document has been parsed next to it.
+        for node in list(doctree.findall()):
+            node.parent = None
+            if isinstance(node, nodes.Element):
+                node.children = []
+        doctree.__dict__.clear()
+
     def finish(self) -> None:
         # super().finish()
         pass
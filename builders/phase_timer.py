@@ -0,0 +1,166 @@
+import contextlib
+import time
+from typing import Any, Dict, List
+
+from docutils.parsers.rst import directives
+from sphinx.application import Sphinx
+
+# Returned instead of a timing context when no timer is installed, so that
+# disabled instrumentation costs one attribute check per phase.
+NO_TIMING = contextlib.nullcontext()
+
+
+class PhaseStats:
+    __slots__ = ("calls", "wall", "cpu")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"calls": self.calls, "wall": self.wall, "cpu": self.cpu}
+
+
+class PhaseTimer:
+    """Wall and CPU time per document and phase, per directive and per
+    transform."""
+
+    def __init__(self) -> None:
+        self.documents: Dict[str, Dict[str, PhaseStats]] = {}
+        self.directives: Dict[str, PhaseStats] = {}
+        self.transforms: Dict[str, PhaseStats] = {}
+
+    @contextlib.contextmanager
+    def measure(self, stats: PhaseStats):
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            stats.calls += 1
+            stats.wall += time.perf_counter() - start_wall
+            stats.cpu += time.process_time() - start_cpu
+
+    def phase(self, docname: str, phase: str):
+        document = self.documents.setdefault(docname, {})
+        stats = document.get(phase)
+        if stats is None:
+            stats = document[phase] = PhaseStats()
+        return self.measure(stats)
+
+    def directive(self, name: str):
+        stats = self.directives.get(name)
+        if stats is None:
+            stats = self.directives[name] = PhaseStats()
+        return self.measure(stats)
+
+    def transform(self, name: str):
+        stats = self.transforms.get(name)
+        if stats is None:
+            stats = self.transforms[name] = PhaseStats()
+        return self.measure(stats)
+
+    def phase_totals(self) -> Dict[str, PhaseStats]:
+        totals: Dict[str, PhaseStats] = {}
+        for document in self.documents.values():
+            for phase, stats in document.items():
+                total = totals.setdefault(phase, PhaseStats())
+                total.calls += stats.calls
+                total.wall += stats.wall
+                total.cpu += stats.cpu
+        return totals
+
+    def as_dict(self) -> dict:
+        return {
+            "documents": {
+                docname: {
+                    phase: stats.as_dict() for phase, stats in document.items()
+                }
+                for docname, document in self.documents.items()
+            },
+            "directives": {
+                name: stats.as_dict() for name, stats in self.directives.items()
+            },
+            "transforms": {
+                name: stats.as_dict() for name, stats in self.transforms.items()
+            },
+        }
+
+    def stats(self) -> dict:
+        return self.as_dict()
+
+    def format_table(self) -> str:
+        rows: List[tuple] = [
+            (phase, stats) for phase, stats in self.phase_totals().items()
+        ]
+        rows.extend(
+            (f"directive {name}", stats)
+            for name, stats in self.directives.items()
+        )
+        # The most expensive transforms first.
+        rows.extend(
+            (f"transform {name}", stats)
+            for name, stats in sorted(
+                self.transforms.items(), key=lambda item: -item[1].wall
+            )
+        )
+        width = max([len("phase")] + [len(name) for name, _ in rows])
+        lines = [
+            f"{'phase':<{width}}  {'calls':>6}  {'wall ms':>10}  {'cpu ms':>10}"
+        ]
+        for name, stats in rows:
+            lines.append(
+                f"{name:<{width}}  {stats.calls:>6}  "
+                f"{stats.wall * 1000:>10.2f}  {stats.cpu * 1000:>10.2f}"
+            )
+        return "\n".join(lines)
+
+
+class PhaseTimingMixin:
+    """Lets a builder time its phases when a PhaseTimer is installed."""
+
+    phase_timer = None
+
+    def timed(self, docname: str, phase: str):
+        if self.phase_timer is None:
+            return NO_TIMING
+        return self.phase_timer.phase(docname, phase)
+
+    @contextlib.contextmanager
+    def timed_calls(self, docname: str, phase: str, owner: Any, name: str):
+        """Time the calls of owner's method name as phase, for the phases
+        that happen inside the Sphinx methods the builder inherits."""
+        if self.phase_timer is None:
+            yield
+            return
+        method = getattr(owner, name)
+
+        def timed_method(*args, **kwargs):
+            with self.timed(docname, phase):
+                return method(*args, **kwargs)
+
+        setattr(owner, name, timed_method)
+        try:
+            yield
+        finally:
+            delattr(owner, name)
+
+
+def install_directive_timing(
+    app: Sphinx, timer: PhaseTimer, names: List[str]
+) -> None:
+    """Time every run of the named directives, whatever class they use."""
+    for name in names:
+        directive_class, _ = directives.directive(name, None, None)
+        if directive_class is None:
+            continue
+
+        def run(self, directive_class=directive_class):
+            with timer.directive(self.name):
+                return directive_class.run(self)
+
+        timed_class = type(
+            f"Timed{directive_class.__name__}", (directive_class,), {"run": run}
+        )
+        app.add_directive(name, timed_class, override=True)
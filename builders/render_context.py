@@ -0,0 +1,32 @@
+from typing import Any
+
+from docutils.frontend import OptionParser
+from docutils.utils import DependencyList
+from sphinx.builders import Builder
+from sphinx.writers.html import HTMLWriter
+
+
+class RenderContext:
+    """Docutils state that depends only on the configuration.
+
+    Creating a Publisher runs the full docutils option parser and creating
+    the writer settings re-reads the docutils config files from disk, so
+    both are done once and shared by every document rendered with the same
+    configuration fingerprint.
+    """
+
+    def __init__(self, builder: Builder, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        self.publisher = builder.create_publisher(
+            builder.app, "restructuredtext"
+        )
+        self.docwriter = HTMLWriter(builder)
+        self.docsettings: Any = OptionParser(
+            defaults=builder.env.settings,
+            components=(self.docwriter,),
+            read_config_files=True).get_default_values()
+
+    def reset(self) -> None:
+        # record_dependencies is mutable even though it is in settings,
+        # explicitly re-initialise for each document.
+        self.publisher.settings.record_dependencies = DependencyList()
@@ -1,24 +1,132 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
 from docutils import nodes
 from docutils.io import StringOutput
 from sphinx.application import Sphinx
+from sphinx.builders import Builder
+from sphinx.builders.html import StandaloneHTMLBuilder
 from sphinx.builders.singlehtml import SingleFileHTMLBuilder
 from sphinx.environment import BuildEnvironment
-from sphinx.util import relative_uri
+from sphinx.util import get_filetype, relative_uri
+from sphinx.util.parallel import ParallelTasks, make_chunks
+
+from builders.phase_timer import PhaseTimingMixin
+
 
+class SingleFileHTMLBuilderWithoutFinish(PhaseTimingMixin, SingleFileHTMLBuilder):
+    """singlehtml without writing pages: the HTML body of what it renders
+    is kept in memory.
+
+    By default, the whole project is assembled into the root document, as
+    with singlehtml, and output is its HTML. With per_document, each
+    document is resolved and written on its own, as with the html builder,
+    and links between documents point to separate pages. Documents are
+    then written in parallel when the app has more than one process.
+    Either way, outputs holds the HTML of every written document by
+    docname, and output that of the root document. With per_document and
+    incremental, outputs is kept between builds and only the documents that
+    were read again, or have no output yet, are written.
+    """
 
-class SingleFileHTMLBuilderWithoutFinish(SingleFileHTMLBuilder):
     name = 'single_file_html_without_finish'
     format = 'custom'
+    # Only used with per_document: SingleFileHTMLBuilder.write() writes the
+    # one assembled document serially.
+    allow_parallel = True
 
     def __init__(self, app: Sphinx, env: BuildEnvironment = None) -> None:
         super().__init__(app, env)
         self.init()
         assert self.highlighter is not None
+        self.per_document = False
+        self.incremental = False
+        self.outputs: Dict[str, str] = {}
         self.output = None
 
+    def read_doc(self, docname: str, **kwargs: Any) -> None:
+        # Builder.read_doc() parses and transforms the document in
+        # publish() of the publisher that the registry keeps per file type.
+        filetype = get_filetype(
+            self.app.config.source_suffix, self.env.doc2path(docname)
+        )
+        publisher = self.app.registry.get_publisher(self.app, filetype)
+        parse = self.timed_calls(docname, "parse", publisher.reader, "read")
+        transforms = self.timed_calls(
+            docname, "transforms", publisher, "apply_transforms"
+        )
+        with parse, transforms:
+            super().read_doc(docname, **kwargs)
+
+    def assemble_doctree(self) -> nodes.document:
+        master = self.config.root_doc
+        with self.timed_calls(
+            master, "resolve_references", self.env, "resolve_references"
+        ):
+            return super().assemble_doctree()
+
+    def get_outdated_docs(self):
+        if self.per_document and self.incremental:
+            # Builder.write() adds the documents that were read again.
+            return [
+                docname
+                for docname in self.env.found_docs
+                if docname not in self.outputs
+            ]
+        return super().get_outdated_docs()
+
+    def get_target_uri(self, docname: str, typ: str = None) -> str:
+        if self.per_document:
+            return StandaloneHTMLBuilder.get_target_uri(self, docname, typ)
+        return super().get_target_uri(docname, typ)
+
+    def get_relative_uri(self, from_: str, to: str, typ: str = None) -> str:
+        if self.per_document:
+            return StandaloneHTMLBuilder.get_relative_uri(self, from_, to, typ)
+        return super().get_relative_uri(from_, to, typ)
+
     def prepare_writing(self, docnames):
         super().prepare_writing(docnames)
 
+    def write(self, *args: Any) -> None:
+        if not (self.per_document and self.incremental):
+            self.outputs = {}
+        self.output = None
+        if self.per_document:
+            Builder.write(self, *args)
+        else:
+            super().write(*args)
+
+    def copy_assets(self) -> None:
+        # Like finish(), which is skipped: nothing is written to outdir.
+        pass
+
+    def _write_parallel(self, docnames: Sequence[str], nproc: int) -> None:
+        # Builder._write_parallel() drops what its workers return, so the
+        # HTML they render would stay in their processes.
+        def write_process(
+            docs: List[Tuple[str, nodes.document]]
+        ) -> List[Tuple[str, str]]:
+            for docname, doctree in docs:
+                self.write_doc(docname, doctree)
+            return [(docname, self.outputs[docname]) for docname, _ in docs]
+
+        def on_chunk_done(
+            docs: List[Tuple[str, nodes.document]],
+            outputs: List[Tuple[str, str]],
+        ) -> None:
+            for docname, body in outputs:
+                self.store_output(docname, body)
+
+        tasks = ParallelTasks(nproc)
+        for chunk in make_chunks(docnames, nproc):
+            docs = []
+            for docname in chunk:
+                doctree = self.env.get_and_resolve_doctree(docname, self)
+                self.write_doc_serialized(docname, doctree)
+                docs.append((docname, doctree))
+            tasks.add_task(write_process, docs, on_chunk_done)
+        tasks.join()
+
     def write_doc(self, docname: str, doctree: nodes.document) -> None:
         # super().write_doc(docname, doctree)
         destination = StringOutput(encoding='utf-8')
@@ -30,17 +138,24 @@ class SingleFileHTMLBuilderWithoutFinish(SingleFileHTMLBuilder):
         self.dlpath = relative_uri(self.get_target_uri(docname), '_downloads')
         self.current_docname = docname
 
-        self.docwriter.write(doctree, destination)
-        self.docwriter.assemble_parts()
+        with self.timed(docname, "write"):
+            self.docwriter.write(doctree, destination)
+        with self.timed(docname, "assemble_parts"):
+            self.docwriter.assemble_parts()
 
         # WIP: Here we don't do anything else because we already have our
         # HTML content in memory. Builder can simply store it now.
-        # body = self.docwriter.parts['fragment']
-        # self.output = body
+        body = self.docwriter.parts['fragment']
+        self.store_output(docname, body)
 
         # ctx = self.get_doc_context(docname, body, metatags)
         # self.handle_page(docname, ctx, event_arg=doctree)
 
+    def store_output(self, docname: str, body: str) -> None:
+        self.outputs[docname] = body
+        if docname == self.config.root_doc:
+            self.output = body
+
     def finish(self) -> None:
         # WIP: This saves quite a lot of time.
         # super().finish()
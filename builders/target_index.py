@@ -0,0 +1,263 @@
+import copy
+import hashlib
+import os
+import pickle
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from docutils import nodes
+from sphinx.application import Sphinx
+from sphinx.domains import Domain
+from sphinx.environment import BuildEnvironment
+from sphinx.transforms import SphinxContentsFilter
+from sphinx.util.parallel import ParallelTasks, make_chunks, parallel_available
+
+from builders.fragment_cache import config_fingerprint
+
+# Labels, and the objects that breathe and the object directives declare.
+TARGET_DOMAINS = ["std", "c", "cpp", "py"]
+
+# Like Builder.read(), which only reads in parallel above this many
+# documents.
+PARALLEL_READ_THRESHOLD = 5
+
+
+def _target_domains(env: BuildEnvironment) -> Dict[str, Domain]:
+    return {
+        name: env.domains[name]
+        for name in TARGET_DOMAINS
+        if name in env.domains
+    }
+
+
+def _document_title(doctree: nodes.document) -> nodes.title:
+    # What TitleCollector.process_doc() stores in env.titles, which is not
+    # collected for fragments.
+    title = nodes.title()
+    for section in doctree.findall(nodes.section):
+        visitor = SphinxContentsFilter(doctree)
+        section[0].walkabout(visitor)
+        title += visitor.get_entry_text()
+        break
+    else:
+        title += nodes.Text("<no title>")
+    return title
+
+
+class IndexedDocument(NamedTuple):
+    digest: str
+    title: nodes.title
+    # Pickled: the C and C++ symbol trees cannot be deep-copied.
+    domaindata: bytes
+
+
+class TargetIndex:
+    """The reference targets of a whole project, for fragments to link to.
+
+    Each document of the project is read once with the minimal builder,
+    and the labels and objects it adds to the std, C, C++ and Python
+    domains are kept, together with its title for :doc: references. Only
+    documents whose source has changed are read again by update(). The
+    index is installed into the domain data of the fragment environment
+    itself, so the domains resolve references to other documents with
+    their usual lookups, and rendering a fragment, which only clears the
+    root document, leaves the installed documents in place. A fragment that
+    declares an object of the index again is a duplicate declaration, as
+    it would be in the project.
+    """
+
+    def __init__(self, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        self.documents: Dict[str, IndexedDocument] = {}
+        # The digests of the documents installed into an environment.
+        self.installed: Dict[str, str] = {}
+        self._digest: Optional[str] = None
+
+        self.documents_read = 0
+        self.documents_reused = 0
+
+    @classmethod
+    def load(cls, app: Sphinx, path_to_index: str) -> "TargetIndex":
+        """The index stored at path_to_index, or an empty one if there is
+        none or it was built with another configuration."""
+        target_index = cls(config_fingerprint(app))
+        try:
+            with open(path_to_index, "rb") as file:
+                fingerprint, documents = pickle.load(file)
+        except FileNotFoundError:
+            return target_index
+        if fingerprint == target_index.fingerprint:
+            target_index.documents = documents
+            target_index._digest = None
+        return target_index
+
+    def save(self, path_to_index: str) -> None:
+        path_to_tmp = f"{path_to_index}.{os.getpid()}.tmp"
+        with open(path_to_tmp, "wb") as file:
+            pickle.dump(
+                (self.fingerprint, self.documents),
+                file,
+                pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(path_to_tmp, path_to_index)
+
+    @property
+    def digest(self) -> str:
+        """Changes whenever a document is indexed or removed."""
+        if self._digest is None:
+            digest = hashlib.sha256()
+            for docname in sorted(self.documents):
+                entry = f"{docname}\0{self.documents[docname].digest}\0"
+                digest.update(entry.encode("utf-8"))
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def update(self, app: Sphinx, documents: Mapping[str, str]) -> List[str]:
+        """Index the documents, given as RST source by docname, that are
+        new or have changed. Returns their docnames."""
+        assert app.builder.name == "minimal"
+        outdated: List[Tuple[str, str, str]] = []
+        for docname, rst in documents.items():
+            if docname == app.config.root_doc:
+                raise ValueError(
+                    f"{docname!r} is the document that fragments are "
+                    "rendered as and cannot be indexed"
+                )
+            digest = hashlib.sha256(rst.encode("utf-8")).hexdigest()
+            indexed_document = self.documents.get(docname)
+            if (
+                indexed_document is not None
+                and indexed_document.digest == digest
+            ):
+                self.documents_reused += 1
+                continue
+            outdated.append((docname, rst, digest))
+
+        if (
+            parallel_available
+            and app.parallel > 1
+            and len(outdated) > PARALLEL_READ_THRESHOLD
+        ):
+            self._read_parallel(app, outdated, nproc=app.parallel)
+        else:
+            for docname, rst, digest in outdated:
+                self.documents[docname] = self.read_document(
+                    app, docname, rst, digest
+                )
+        if outdated:
+            self._digest = None
+        self.documents_read += len(outdated)
+        return [docname for docname, _, _ in outdated]
+
+    def _read_parallel(
+        self, app: Sphinx, outdated: List[Tuple[str, str, str]], nproc: int
+    ) -> None:
+        """Read the documents in chunks in worker processes, as
+        Builder._read_parallel() does, and merge what they index."""
+
+        def read_process(
+            chunk: List[Tuple[str, str, str]]
+        ) -> List[Tuple[str, IndexedDocument]]:
+            return [
+                (docname, self.read_document(app, docname, rst, digest))
+                for docname, rst, digest in chunk
+            ]
+
+        def merge(
+            chunk: List[Tuple[str, str, str]],
+            indexed_documents: List[Tuple[str, IndexedDocument]],
+        ) -> None:
+            self.documents.update(indexed_documents)
+
+        tasks = ParallelTasks(nproc)
+        for chunk in make_chunks(outdated, nproc):
+            tasks.add_task(read_process, chunk, merge)
+        tasks.join()
+
+    def update_from_directory(
+        self, app: Sphinx, path_to_project: str
+    ) -> List[str]:
+        """Index the .rst files under path_to_project and forget the
+        documents whose file is gone. Returns the docnames read again."""
+        documents = {}
+        for dirpath, _, filenames in os.walk(path_to_project):
+            for filename in sorted(filenames):
+                if not filename.endswith(".rst"):
+                    continue
+                path_to_file = os.path.join(dirpath, filename)
+                docname = os.path.relpath(path_to_file, path_to_project)
+                docname = docname[: -len(".rst")].replace(os.path.sep, "/")
+                with open(path_to_file, encoding="utf-8") as file:
+                    documents[docname] = file.read()
+        self.remove(set(self.documents) - set(documents))
+        return self.update(app, documents)
+
+    def remove(self, docnames: Iterable[str]) -> None:
+        for docname in docnames:
+            if self.documents.pop(docname, None) is not None:
+                self._digest = None
+
+    @staticmethod
+    def read_document(
+        app: Sphinx, docname: str, rst: str, digest: str
+    ) -> IndexedDocument:
+        builder = app.builder
+        env = app.env
+        domains = _target_domains(env)
+        saved_data = {name: domain.data for name, domain in domains.items()}
+        saved_input = builder.strictdoc_input
+        # What the document adds is collected in empty domain data, as in
+        # DoxygenDirectiveCache.run().
+        for name, domain in domains.items():
+            domain.data = env.domaindata[name] = copy.deepcopy(
+                {**domain.initial_data, "version": domain.data_version}
+            )
+        builder.strictdoc_input = rst
+        try:
+            builder.read_doc(docname)
+            title = _document_title(builder.doctree)
+        finally:
+            domaindata = {name: domain.data for name, domain in domains.items()}
+            for name, domain in domains.items():
+                domain.data = env.domaindata[name] = saved_data[name]
+            builder.strictdoc_input = saved_input
+            builder.reset_document(docname)
+
+        # The std domain creates its glossary terms lazily, but its
+        # merge_domaindata() expects them.
+        if "std" in domaindata:
+            domaindata["std"].setdefault("terms", {})
+        return IndexedDocument(
+            digest, title, pickle.dumps(domaindata, pickle.HIGHEST_PROTOCOL)
+        )
+
+    def install(self, app: Sphinx) -> None:
+        """Bring the documents in app.env up to date with the index."""
+        env = app.env
+        for docname, digest in list(self.installed.items()):
+            indexed_document = self.documents.get(docname)
+            if indexed_document is None or indexed_document.digest != digest:
+                env.clear_doc(docname)
+                env.all_docs.pop(docname, None)
+                env.titles.pop(docname, None)
+                del self.installed[docname]
+
+        for docname, indexed_document in self.documents.items():
+            if docname in self.installed:
+                continue
+            domaindata = pickle.loads(indexed_document.domaindata)
+            for name, domain in _target_domains(env).items():
+                if name in domaindata:
+                    domain.merge_domaindata([docname], domaindata[name])
+            # Looked up by :doc: references.
+            env.all_docs[docname] = 0
+            env.titles[docname] = indexed_document.title
+            self.installed[docname] = indexed_document.digest
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "documents": len(self.documents),
+            "installed": len(self.installed),
+            "documents_read": self.documents_read,
+            "documents_reused": self.documents_reused,
+        }
+
@@ -0,0 +1,152 @@
+from typing import Any, Dict, Iterable, List, Type
+
+from docutils.transforms import Transform
+from sphinx.application import Sphinx
+from sphinx.config import Config
+from sphinx.environment.collectors import EnvironmentCollector
+from sphinx.io import SphinxStandaloneReader
+
+# Transforms and environment collectors that only matter for whole
+# documents or whole projects: document titles and docinfo, toctrees and
+# section numbers, dependency tracking, translations and versioning.
+DEFAULT_FRAGMENT_TRANSFORMS_DENY = [
+    "docutils.transforms.frontmatter.DocTitle",
+    "docutils.transforms.frontmatter.DocInfo",
+    "docutils.transforms.frontmatter.SectionSubTitle",
+    "docutils.transforms.universal.Decorations",
+    "sphinx.builders.latex.transforms.FootnoteDocnameUpdater",
+    "sphinx.transforms.ApplySourceWorkaround",
+    "sphinx.transforms.ExtraTranslatableNodes",
+    "sphinx.transforms.i18n.PreserveTranslatableMessages",
+    "sphinx.transforms.i18n.Locale",
+    "sphinx.transforms.i18n.TranslationProgressTotaliser",
+    "sphinx.transforms.i18n.AddTranslationClasses",
+    "sphinx.versioning.UIDTransform",
+    "sphinx.environment.collectors.dependencies.DependenciesCollector",
+    "sphinx.environment.collectors.metadata.MetadataCollector",
+    "sphinx.environment.collectors.title.TitleCollector",
+    "sphinx.environment.collectors.toctree.TocTreeCollector",
+]
+
+
+def qualified_name(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__name__}"
+
+
+class TransformProfile:
+    """Selects the transforms and environment collectors run on fragments.
+
+    Entries of allow and deny are qualified class names, or bare class
+    names. A class runs unless it is denied and not allowed; "*" in deny
+    denies everything that is not allowed explicitly.
+    """
+
+    def __init__(
+        self,
+        allow: Iterable[str] = (),
+        deny: Iterable[str] = DEFAULT_FRAGMENT_TRANSFORMS_DENY,
+    ) -> None:
+        self.allow = frozenset(allow)
+        self.deny = frozenset(deny)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "TransformProfile":
+        return cls(
+            config.fragment_transforms_allow, config.fragment_transforms_deny
+        )
+
+    def includes(self, cls: type) -> bool:
+        name = qualified_name(cls)
+        if name in self.allow or cls.__name__ in self.allow:
+            return True
+        return not (
+            "*" in self.deny or name in self.deny or cls.__name__ in self.deny
+        )
+
+    def configure_collectors(
+        self, app: Sphinx, collectors: List[EnvironmentCollector]
+    ) -> None:
+        for collector in collectors:
+            enabled = collector.listener_ids is not None
+            if self.includes(type(collector)) != enabled:
+                if enabled:
+                    collector.disable(app)
+                else:
+                    collector.enable(app)
+
+
+def find_env_collectors(app: Sphinx) -> List[EnvironmentCollector]:
+    """Return the environment collectors that are currently enabled."""
+    collectors = []
+    for listener in app.events.listeners["doctree-read"]:
+        collector = getattr(listener.handler, "__self__", None)
+        if isinstance(collector, EnvironmentCollector):
+            collectors.append(collector)
+    return collectors
+
+
+class FragmentReader(SphinxStandaloneReader):
+    """A reader that applies only the transforms of a TransformProfile.
+
+    When the builder has a phase timer, every transform is timed under its
+    qualified name.
+    """
+
+    def __init__(self, profile: TransformProfile, builder) -> None:
+        super().__init__()
+        self.profile = profile
+        self.builder = builder
+        self.timed_transforms: Dict[type, Type[Transform]] = {}
+
+    def get_transforms(self) -> List[Type[Transform]]:
+        transforms = [
+            transform
+            for transform in super().get_transforms()
+            if self.profile.includes(transform)
+        ]
+        if self.builder.phase_timer is None:
+            return transforms
+        return [self.get_timed_transform(transform) for transform in transforms]
+
+    def get_timed_transform(
+        self, transform_class: Type[Transform]
+    ) -> Type[Transform]:
+        timed_class = self.timed_transforms.get(transform_class)
+        if timed_class is None:
+            builder = self.builder
+            name = qualified_name(transform_class)
+
+            def apply(self, **kwargs):
+                with builder.phase_timer.transform(name):
+                    return transform_class.apply(self, **kwargs)
+
+            timed_class = type(
+                f"Timed{transform_class.__name__}",
+                (transform_class,),
+                {"apply": apply},
+            )
+            self.timed_transforms[transform_class] = timed_class
+        return timed_class
+
+
+def setup(app: Sphinx) -> Dict[str, Any]:
+    """Register the fragment_transforms_allow and fragment_transforms_deny
+    configuration values.
+
+    Listed in the extensions of conf.py, this runs before the values of
+    conf.py are applied. The converter runs it once the app exists, so it
+    applies the values of conf.py and of the overrides itself.
+    """
+    defaults = {
+        "fragment_transforms_allow": [],
+        "fragment_transforms_deny": DEFAULT_FRAGMENT_TRANSFORMS_DENY,
+    }
+    for name, default in defaults.items():
+        if name in app.config:
+            continue
+        app.add_config_value(name, default, "env")
+        if name in app.config.overrides:
+            setattr(app.config, name, app.config.overrides[name])
+        elif name in app.config._raw_config:
+            setattr(app.config, name, app.config._raw_config[name])
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
@@ -0,0 +1,343 @@
+import os
+import shutil
+from typing import Any, Dict
+
+from breathe import setup
+from sphinx.application import Sphinx
+from sphinx.builders.singlehtml import SingleFileHTMLBuilder
+
+from builders.block_render import BlockRenderer
+from builders.doxygen_directive_cache import (
+    DOXYGEN_DIRECTIVES,
+    install_doxygen_directive_cache,
+)
+from builders.doctree_cache import DoctreeCache
+from builders.doxygen_index import (
+    DoxygenIndex,
+    install_doxygen_index,
+    load_doxygen_index,
+)
+from builders.fragment_cache import FragmentCache, config_fingerprint
+from builders.highlight_cache import (
+    CachingPygmentsBridge,
+    highlighter_fingerprint,
+)
+from builders.in_memory_build import in_memory_builder_class
+from builders.incremental_build import (
+    IncrementalBuild,
+    install_incremental_build,
+)
+from builders.memory_report import MemoryReport
+from builders.minimal_builder import MinimalBuilder
+from builders.phase_timer import PhaseTimer, install_directive_timing
+from builders.target_index import TargetIndex
+from builders.single_file_html_without_finish import \
+    SingleFileHTMLBuilderWithoutFinish
+from builders.transform_profile import setup as setup_transform_profile
+
+BUILDERS = ["single_file_html", "single_file_html_without_finish", "minimal"]
+
+MINIMAL_BUILDER_RST = """Hello **world**
+
+.. doxygenfile:: imu.h
+   :project: DO-178C
+
+We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
+
+We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
+
+We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
+
+We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
+"""
+
+
+def create_app(
+    path_to_rst_tree,
+    path_to_build,
+    selected_builder,
+    in_memory=False,
+    parallel=0,
+    incremental=False,
+    confdir=None,
+) -> Sphinx:
+    """Create the Sphinx app for selected_builder.
+
+    With in_memory, the builder keeps everything it would write to outdir
+    and doctreedir in its virtual_store instead. Sphinx.__init__ and
+    Builder.__init__ still create both directories, empty, once.
+
+    parallel is the number of processes that Sphinx may use, as with
+    sphinx-build -j. With incremental, the environment and doctrees of the
+    previous build in path_to_build are kept, see enable_incremental_build().
+
+    confdir is the directory of a conf.py to read, as with sphinx-build -c.
+    By default none is read. The theme and the breathe projects are set by
+    the converter either way.
+    """
+    srcdir = path_to_rst_tree
+    outdir = os.path.join(path_to_build, "sphinx_html")
+    doctreedir = os.path.join(path_to_build, "doctrees")
+
+    if not in_memory and not incremental:
+        if os.path.exists(doctreedir):
+            shutil.rmtree(doctreedir)
+        if os.path.exists(outdir):
+            shutil.rmtree(outdir)
+
+    confoverrides = {}
+    confoverrides["html_theme"] = "my_theme"
+    confoverrides["html_theme_path"] = ["themes"]
+
+    # Initialize and build the Sphinx application
+    app = Sphinx(
+        srcdir=srcdir,
+        confdir=confdir,
+        outdir=outdir,
+        doctreedir=doctreedir,
+        confoverrides=confoverrides,
+        buildername="singlehtml",
+        parallel=parallel,
+    )
+
+    # Register builder.
+    if selected_builder == "single_file_html_without_finish":
+        builder_class = SingleFileHTMLBuilderWithoutFinish
+        if in_memory:
+            builder_class = in_memory_builder_class(builder_class)
+        builder = builder_class(app, app.env)
+        builder.use_index = False
+        app.registry.builders["single_file_html_without_finish"] = builder
+        app.builder = app.registry.builders["single_file_html_without_finish"]
+    elif selected_builder == "minimal":
+        builder = MinimalBuilder(app, app.env)
+        builder.use_index = False
+        app.registry.builders["minimal"] = builder
+        app.builder = app.registry.builders["minimal"]
+
+        # Instead of running no Sphinx transforms at all, the builder skips
+        # those that only matter for whole documents, see TransformProfile.
+        setup_transform_profile(app)
+    elif selected_builder == "single_file_html":
+        if in_memory:
+            builder = in_memory_builder_class(SingleFileHTMLBuilder)(
+                app, app.env
+            )
+            builder.init()
+            app.builder = builder
+        # Otherwise do nothing: We are already using the native singlehtml
+        # builder.
+    else:
+        raise NotImplementedError
+
+    app.config.breathe_projects = {"DO-178C": "_xml"}
+    app.config.html_sidebars = {
+        '**': [],
+    }
+
+    setup(app=app)
+
+    return app
+
+
+def is_in_memory(app: Sphinx) -> bool:
+    return hasattr(app.builder, "virtual_store")
+
+
+def rebuild(app: Sphinx, incremental=False) -> None:
+    """Build again from scratch or, with incremental, only what changed."""
+    if incremental:
+        app.build(force_all=False)
+        return
+
+    # The minimal builder writes nothing to these directories either.
+    if not is_in_memory(app) and app.builder.name != "minimal":
+        if os.path.exists(app.doctreedir):
+            shutil.rmtree(app.doctreedir)
+        if os.path.exists(app.outdir):
+            shutil.rmtree(app.outdir)
+
+    app.build(force_all=False)
+    app.env.clear_doc("index")
+
+
+def rendered_html(app: Sphinx) -> str:
+    """Return what the last build rendered for the root document."""
+    builder = app.builder
+    if builder.name == "minimal":
+        return builder.strictdoc_output
+    if builder.name == "single_file_html_without_finish":
+        return builder.output
+    filename = builder.get_outfilename(app.config.root_doc)
+    if is_in_memory(app):
+        data = builder.virtual_store.read(filename)
+    else:
+        with open(filename, "rb") as file:
+            data = file.read()
+    return data.decode(app.config.html_output_encoding)
+
+
+def enable_fragment_cache(app: Sphinx, cache_dir=None) -> FragmentCache:
+    assert app.builder.name == "minimal"
+    fragment_cache = FragmentCache(
+        config_fingerprint(app), cache_dir=cache_dir
+    )
+    app.builder.fragment_cache = fragment_cache
+    return fragment_cache
+
+
+def enable_doctree_cache(app: Sphinx, cache_dir=None) -> DoctreeCache:
+    assert app.builder.name == "minimal"
+    doctree_cache = DoctreeCache(app, cache_dir=cache_dir)
+    app.builder.doctree_cache = doctree_cache
+    return doctree_cache
+
+
+def enable_highlight_cache(
+    app: Sphinx, cache_dir=None
+) -> CachingPygmentsBridge:
+    # Translators take the highlighter from the builder when they are
+    # created, so this works for every builder.
+    highlighter = app.builder.highlighter
+    cache = FragmentCache(
+        highlighter_fingerprint(highlighter), cache_dir=cache_dir
+    )
+    app.builder.highlighter = CachingPygmentsBridge(highlighter, cache)
+    return app.builder.highlighter
+
+
+def enable_block_rendering(app: Sphinx) -> BlockRenderer:
+    assert app.builder.name == "minimal"
+    block_renderer = BlockRenderer(app.builder)
+    app.builder.block_renderer = block_renderer
+    return block_renderer
+
+
+def enable_memory_report(app: Sphinx) -> MemoryReport:
+    assert app.builder.name == "minimal"
+    memory_report = MemoryReport()
+    app.builder.memory_report = memory_report
+    return memory_report
+
+
+def enable_target_index(
+    app: Sphinx, path_to_index=None, path_to_project=None
+) -> TargetIndex:
+    """Let fragments link to the labels, objects and documents of another
+    project.
+
+    The index at path_to_index is brought up to date with the .rst files
+    under path_to_project and saved again, if both are given.
+    """
+    assert app.builder.name == "minimal"
+    if path_to_index is not None:
+        target_index = TargetIndex.load(app, path_to_index)
+    else:
+        target_index = TargetIndex(config_fingerprint(app))
+    if path_to_project is not None:
+        digest = target_index.digest
+        target_index.update_from_directory(app, path_to_project)
+        if path_to_index is not None and target_index.digest != digest:
+            target_index.save(path_to_index)
+    target_index.install(app)
+    app.builder.target_index = target_index
+    return target_index
+
+
+def enable_incremental_build(app: Sphinx) -> IncrementalBuild:
+    """Read and write again only the documents whose files have changed,
+    by content; the app must be created with incremental."""
+    assert not is_in_memory(app) and app.builder.name != "minimal"
+    if app.builder.name == "single_file_html_without_finish":
+        app.builder.incremental = True
+    return install_incremental_build(app)
+
+
+def enable_doxygen_index(app: Sphinx, path_to_index: str) -> DoxygenIndex:
+    doxygen_index = load_doxygen_index(app, path_to_index)
+    install_doxygen_index(app, doxygen_index)
+    return doxygen_index
+
+
+def enable_phase_timing(app: Sphinx) -> PhaseTimer:
+    phase_timer = PhaseTimer()
+    # The native singlehtml builder has no timing hooks.
+    if app.builder.name != "singlehtml":
+        app.builder.phase_timer = phase_timer
+    install_directive_timing(app, phase_timer, DOXYGEN_DIRECTIVES)
+    return phase_timer
+
+
+def configure_transform_profile(app: Sphinx, allow=None, deny=None) -> None:
+    assert app.builder.name == "minimal"
+    # On top of the lists from the configuration.
+    if allow:
+        app.config.fragment_transforms_allow = (
+            list(app.config.fragment_transforms_allow) + list(allow)
+        )
+    if deny:
+        app.config.fragment_transforms_deny = (
+            list(app.config.fragment_transforms_deny) + list(deny)
+        )
+
+
+def configure_app(
+    app: Sphinx,
+    cache_dir=None,
+    doxygen_index=None,
+    memoize_doxygen=False,
+    profile_phases=False,
+    allow_transforms=None,
+    deny_transforms=None,
+    incremental_blocks=False,
+    low_memory=False,
+    report_memory=False,
+    fast_translator=False,
+    highlight_cache=None,
+    target_index=None,
+    target_project=None,
+    doctree_cache=None,
+    per_document=False,
+    incremental=False,
+) -> Dict[str, Any]:
+    """Enable the optional features and return their stateful parts by name.
+
+    Every returned object has a stats() method.
+    """
+    features: Dict[str, Any] = {}
+    if allow_transforms or deny_transforms:
+        configure_transform_profile(app, allow_transforms, deny_transforms)
+    if doxygen_index is not None:
+        features["doxygen_index"] = enable_doxygen_index(app, doxygen_index)
+    # Before the fragment cache, whose keys depend on the index.
+    if target_index is not None or target_project is not None:
+        features["targets"] = enable_target_index(
+            app, target_index, target_project
+        )
+    if memoize_doxygen:
+        features["doxygen_directives"] = install_doxygen_directive_cache(app)
+    if profile_phases:
+        features["phase_timer"] = enable_phase_timing(app)
+    if cache_dir is not None:
+        features["fragments"] = enable_fragment_cache(app, cache_dir)
+    if doctree_cache is not None:
+        features["doctrees"] = enable_doctree_cache(app, doctree_cache)
+    if highlight_cache is not None:
+        features["highlight"] = enable_highlight_cache(app, highlight_cache)
+    if incremental_blocks:
+        features["blocks"] = enable_block_rendering(app)
+    if low_memory:
+        assert app.builder.name == "minimal"
+        app.builder.low_memory = True
+    if fast_translator:
+        assert app.builder.name == "minimal"
+        app.builder.fast_translator = True
+    if report_memory:
+        features["memory"] = enable_memory_report(app)
+    if per_document:
+        assert app.builder.name == "single_file_html_without_finish"
+        app.builder.per_document = True
+    # After per_document, which decides whether outputs are stored.
+    if incremental:
+        features["incremental"] = enable_incremental_build(app)
+    return features
@@ -0,0 +1,130 @@
+import asyncio
+import concurrent.futures
+from typing import Optional
+
+from sphinx.application import Sphinx
+
+from converter.worker_pool import FragmentWorkerPool
+
+
+class RendererOverloaded(RuntimeError):
+    """Raised instead of queueing a request when the queue is full."""
+
+
+class AsyncFragmentRenderer:
+    """Renders fragments for asyncio code without blocking the event loop.
+
+    At most max_in_flight requests are handed to the renderer at a time:
+    the warm MinimalBuilder on a single thread, since the builder is not
+    thread-safe, or a FragmentWorkerPool. Up to max_queue further requests
+    wait for a free slot and can be cancelled while they wait; beyond that,
+    render() raises RendererOverloaded at once, so that a burst of requests
+    is turned away quickly instead of piling up.
+    """
+
+    def __init__(
+        self,
+        app: Sphinx,
+        max_in_flight: Optional[int] = None,
+        max_queue: int = 1000,
+        pool: Optional[FragmentWorkerPool] = None,
+    ) -> None:
+        assert app.builder.name == "minimal"
+        if max_in_flight is None:
+            max_in_flight = pool.workers if pool is not None else 1
+        assert max_in_flight > 0 and max_queue >= 0
+
+        self.app = app
+        self.pool = pool
+        self.executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        if pool is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="fragment-renderer"
+            )
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        # Created on first use, inside the running event loop.
+        self.slots: Optional[asyncio.Semaphore] = None
+
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def __enter__(self) -> "AsyncFragmentRenderer":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    async def render(self, rst: str) -> str:
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_in_flight)
+        if (
+            self.in_flight >= self.max_in_flight
+            and self.queued >= self.max_queue
+        ):
+            self.rejected += 1
+            raise RendererOverloaded(
+                f"{self.queued} fragment requests are queued already"
+            )
+
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        try:
+            future = self._submit(rst)
+        except Exception:
+            self.failed += 1
+            self._release()
+            raise
+        # The slot is freed when the renderer is done with the request, not
+        # when the caller stops waiting for it.
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._release)
+        )
+        try:
+            (html,) = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return html
+
+    def _submit(self, rst: str) -> concurrent.futures.Future:
+        if self.pool is not None:
+            return self.pool.submit([rst])
+        return self.executor.submit(self.app.builder.render_many, [rst])
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self.slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import docutils
+import sphinx
+
+from builders.memory_report import peak_rss_bytes
+from converter.app import BUILDERS, MINIMAL_BUILDER_RST, create_app, rebuild
+
+METRICS = ["startup", "cold", "warm"]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of the samples."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "samples": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+    }
+
+
+def _benchmark_builder(
+    path_to_rst_tree, path_to_build, builder, warmup, iterations, cold_runs
+) -> dict:
+    # Runs in a freshly spawned interpreter, so that the cold numbers and
+    # the peak RSS belong to this builder alone.
+    logging.disable(logging.CRITICAL)
+
+    startup_samples, cold_samples, warm_samples = [], [], []
+    app = None
+    for _ in range(cold_runs):
+        start_time = time.perf_counter()
+        app = create_app(path_to_rst_tree, path_to_build, builder)
+        if builder == "minimal":
+            app.builder.strictdoc_input = MINIMAL_BUILDER_RST
+        startup_samples.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        rebuild(app)
+        cold_samples.append(time.perf_counter() - start_time)
+
+    for _ in range(warmup):
+        rebuild(app)
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        rebuild(app)
+        warm_samples.append(time.perf_counter() - start_time)
+
+    peak_rss = peak_rss_bytes()
+    return {
+        "startup": summarize(startup_samples),
+        "cold": summarize(cold_samples),
+        "warm": summarize(warm_samples),
+        "peak_rss_kb": peak_rss // 1024 if peak_rss is not None else None,
+    }
+
+
+def run_benchmark(
+    path_to_rst_tree,
+    path_to_build,
+    builders: List[str],
+    warmup: int,
+    iterations: int,
+    cold_runs: int,
+) -> dict:
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sphinx": sphinx.__version__,
+            "docutils": docutils.__version__,
+        },
+        "settings": {
+            "warmup": warmup,
+            "iterations": iterations,
+            "cold_runs": cold_runs,
+        },
+        "builders": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for builder in builders:
+            results["builders"][builder] = pool.apply(
+                _benchmark_builder,
+                (
+                    path_to_rst_tree,
+                    os.path.join(path_to_build, builder),
+                    builder,
+                    warmup,
+                    iterations,
+                    cold_runs,
+                ),
+            )
+    return results
+
+
+def compare_with_baseline(
+    results: dict, baseline: dict, threshold: float
+) -> Tuple[bool, List[str]]:
+    """Compare median timings; slower than baseline by threshold fails."""
+    passed = True
+    messages = []
+    for builder, builder_results in results["builders"].items():
+        baseline_results = baseline["builders"].get(builder)
+        if baseline_results is None:
+            messages.append(f"{builder}: no baseline, skipped")
+            continue
+        for metric in METRICS:
+            current = builder_results[metric]["median"]
+            previous = baseline_results[metric]["median"]
+            change = (current - previous) / previous if previous > 0 else 0.0
+            verdict = "ok"
+            if change > threshold:
+                verdict = "REGRESSION"
+                passed = False
+            messages.append(
+                f"{builder}: {metric} median {previous * 1000:.2f} ms -> "
+                f"{current * 1000:.2f} ms ({change:+.1%}): {verdict}"
+            )
+    return passed, messages
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="generate_rst_fragment_to_html.py benchmark",
+        description="Benchmark the builders with cold and warm builds.",
+    )
+    parser.add_argument("path_to_rst_tree")
+    parser.add_argument("path_to_build")
+    parser.add_argument(
+        "--builders", nargs="+", choices=BUILDERS, default=BUILDERS
+    )
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--cold-runs",
+        type=int,
+        default=3,
+        help="Number of fresh Sphinx apps to measure the first build of.",
+    )
+    parser.add_argument("--output", help="Write the JSON results here.")
+    parser.add_argument(
+        "--baseline", help="Compare against JSON results saved earlier."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Maximum allowed slowdown of a median, as a fraction.",
+    )
+    args = parser.parse_args(argv)
+
+    assert os.path.isdir(args.path_to_rst_tree)
+    assert args.iterations > 0 and args.cold_runs > 0
+
+    results = run_benchmark(
+        os.path.abspath(args.path_to_rst_tree),
+        os.path.abspath(args.path_to_build),
+        args.builders,
+        args.warmup,
+        args.iterations,
+        args.cold_runs,
+    )
+
+    for builder, builder_results in results["builders"].items():
+        for metric in METRICS:
+            summary = builder_results[metric]
+            print(
+                f"{builder}: {metric}: "
+                + ", ".join(
+                    f"{name} {summary[name] * 1000:.2f} ms"
+                    for name in ("min", "median", "p95", "p99")
+                )
+            )
+        peak_rss_kb = builder_results["peak_rss_kb"]
+        if peak_rss_kb is not None:
+            print(f"{builder}: peak RSS: {peak_rss_kb} KiB")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        passed, messages = compare_with_baseline(
+            results, baseline, args.threshold
+        )
+        for message in messages:
+            print(message)
+        print(f"Benchmark comparison: {'PASS' if passed else 'FAIL'}")
+        if not passed:
+            sys.exit(1)
@@ -0,0 +1,239 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Optional, Tuple, Union
+
+from sphinx.application import Sphinx
+
+from converter.app import configure_app, create_app
+
+# Every message in both directions is a 4-byte big-endian length followed by
+# that many bytes of UTF-8 encoded JSON.
+HEADER = struct.Struct(">I")
+
+# The largest payload that the server accepts. The header allows up to
+# 4 GiB, which the server would otherwise try to allocate.
+DEFAULT_MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+
+class MessageError(Exception):
+    pass
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """HOST:PORT selects TCP, anything else is a Unix domain socket path."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit() and os.sep not in host:
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def send_message(sock: socket.socket, message: dict) -> None:
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(
+    sock: socket.socket, max_bytes: Optional[int] = None
+) -> Optional[dict]:
+    """Receive one message; None when the connection is closed.
+
+    Raises MessageError when the payload is larger than max_bytes, before
+    reading it, or is not a JSON object.
+    """
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if max_bytes is not None and size > max_bytes:
+        raise MessageError(
+            f"message of {size} bytes exceeds the limit of {max_bytes} bytes"
+        )
+    payload = _recv_exactly(sock, size)
+    if payload is None:
+        return None
+    try:
+        message = json.loads(payload.decode("utf-8"))
+    except ValueError as exception:
+        raise MessageError(f"message is not valid JSON: {exception}") from None
+    if not isinstance(message, dict):
+        raise MessageError(
+            f"message is a JSON {type(message).__name__}, not an object"
+        )
+    return message
+
+
+class FragmentRenderer:
+    """Keeps one Sphinx app with a MinimalBuilder warm between renders.
+
+    The builder is not thread-safe, so renders from several connections
+    take turns.
+    """
+
+    def __init__(self, app: Sphinx, features: Optional[dict] = None) -> None:
+        assert app.builder.name == "minimal"
+        self.app = app
+        self.features = features or {}
+        self.lock = threading.Lock()
+
+    def render(self, rst: str) -> str:
+        with self.lock:
+            return self.app.builder.render_many([rst])[0]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                name: feature.stats()
+                for name, feature in self.features.items()
+            }
+
+
+class FragmentRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        # A client can send any number of requests over one connection.
+        while True:
+            try:
+                request = recv_message(
+                    self.request, self.server.max_message_bytes
+                )
+            except MessageError as exception:
+                send_message(
+                    self.request,
+                    {"html": None, "error": str(exception), "elapsed_ms": 0},
+                )
+                # The rest of an oversized payload is still unread, so the
+                # connection cannot be used for further messages.
+                return
+            if request is None:
+                return
+
+            if request.get("command") == "stats":
+                send_message(self.request, self.server.renderer.stats())
+                continue
+
+            if request.get("command") == "shutdown":
+                send_message(self.request, {"status": "shutting down"})
+                # Stops serve_forever() in the main thread.
+                self.server.shutdown()
+                return
+
+            start_time = time.perf_counter()
+            html, error = None, None
+            try:
+                html = self.server.renderer.render(request["rst"])
+            except Exception as exception:  # pylint: disable=broad-except
+                error = f"{type(exception).__name__}: {exception}"
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+            send_message(
+                self.request,
+                {"html": html, "error": error, "elapsed_ms": elapsed_ms},
+            )
+
+
+class _FragmentServerMixin(socketserver.ThreadingMixIn):
+    """Each connection is handled in its own thread, so an idle client does
+    not hold up the others."""
+
+    renderer: FragmentRenderer
+    max_message_bytes = DEFAULT_MAX_MESSAGE_BYTES
+    # Idle connections must not keep the server from shutting down.
+    daemon_threads = True
+    block_on_close = False
+
+
+class UnixFragmentServer(_FragmentServerMixin, socketserver.UnixStreamServer):
+    pass
+
+
+class TCPFragmentServer(_FragmentServerMixin, socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def create_server(
+    renderer: FragmentRenderer,
+    address: str,
+    max_message_bytes: int = DEFAULT_MAX_MESSAGE_BYTES,
+):
+    parsed_address = parse_address(address)
+    if isinstance(parsed_address, tuple):
+        server = TCPFragmentServer(parsed_address, FragmentRequestHandler)
+    else:
+        if os.path.exists(parsed_address):
+            os.unlink(parsed_address)
+        server = UnixFragmentServer(parsed_address, FragmentRequestHandler)
+    server.renderer = renderer
+    server.max_message_bytes = max_message_bytes
+    return server
+
+
+def serve(
+    path_to_rst_tree,
+    path_to_build,
+    address: str,
+    parallel=0,
+    max_message_bytes=DEFAULT_MAX_MESSAGE_BYTES,
+    **options,
+) -> None:
+    app = create_app(
+        path_to_rst_tree, path_to_build, "minimal", parallel=parallel
+    )
+    features = configure_app(app, **options)
+    server = create_server(
+        FragmentRenderer(app, features), address, max_message_bytes
+    )
+    with server:
+        print(f"Serving fragments on: {address}", flush=True)
+        server.serve_forever()
+    if isinstance(server, UnixFragmentServer):
+        os.unlink(server.server_address)
+
+
+class FragmentClient:
+    def __init__(self, address: str) -> None:
+        parsed_address = parse_address(address)
+        if isinstance(parsed_address, tuple):
+            self.sock = socket.create_connection(parsed_address)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(parsed_address)
+
+    def __enter__(self) -> "FragmentClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def render(self, rst: str) -> str:
+        send_message(self.sock, {"rst": rst})
+        response = recv_message(self.sock)
+        assert response is not None, "server closed the connection"
+        if response["error"] is not None:
+            raise RuntimeError(response["error"])
+        return response["html"]
+
+    def stats(self) -> dict:
+        send_message(self.sock, {"command": "stats"})
+        return recv_message(self.sock)
+
+    def shutdown_server(self) -> None:
+        send_message(self.sock, {"command": "shutdown"})
+        recv_message(self.sock)
+
+    def close(self) -> None:
+        self.sock.close()
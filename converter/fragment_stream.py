@@ -0,0 +1,91 @@
+import json
+import time
+from typing import IO, List, Optional, Tuple
+
+from sphinx.application import Sphinx
+
+
+def stream(
+    app: Sphinx,
+    input_stream: IO[str],
+    output_stream: IO[str],
+    batch_size: int = 1,
+) -> None:
+    """Render newline-delimited JSON records one at a time.
+
+    Every input line is a {"id": ..., "rst": ...} record and produces one
+    {"id": ..., "html": ..., "error": ..., "elapsed_ms": ...} output line,
+    which is flushed as soon as it is written. Only one record is held in
+    memory at a time, whatever the size of the input.
+
+    With a batch_size over 1, up to batch_size records are read before
+    they are rendered together, see MinimalBuilder.render_many(), and
+    elapsed_ms counts from the start of the batch. A producer that waits
+    for each output line before writing the next record needs batch_size 1.
+    """
+    assert app.builder.name == "minimal"
+    assert batch_size > 0
+
+    lines: List[str] = []
+    for line in input_stream:
+        if not line.strip():
+            continue
+        lines.append(line)
+        if len(lines) == batch_size:
+            _render_lines(app, lines, output_stream)
+            lines.clear()
+    if lines:
+        _render_lines(app, lines, output_stream)
+
+
+def _render_lines(
+    app: Sphinx, lines: List[str], output_stream: IO[str]
+) -> None:
+    start_time = time.perf_counter()
+    # (id, rst, error) for every line.
+    records: List[Tuple[object, Optional[str], Optional[str]]] = []
+    for line in lines:
+        record_id, rst, error = None, None, None
+        try:
+            record = json.loads(line)
+            record_id = record.get("id")
+            rst = record["rst"]
+        except Exception as exception:  # pylint: disable=broad-except
+            error = f"{type(exception).__name__}: {exception}"
+        records.append((record_id, rst, error))
+
+    fragments = [rst for _, rst, error in records if error is None]
+    try:
+        outputs = app.builder.render_many(
+            fragments, batch_size=max(1, len(fragments))
+        )
+    except Exception:  # pylint: disable=broad-except
+        # Rendered again one by one to tell which record failed.
+        outputs = None
+    if outputs is not None:
+        outputs.reverse()
+
+    for record_id, rst, error in records:
+        html = None
+        if error is None:
+            if outputs is not None:
+                html = outputs.pop()
+            else:
+                try:
+                    html = app.builder.render_many([rst])[0]
+                except Exception as exception:  # pylint: disable=broad-except
+                    error = f"{type(exception).__name__}: {exception}"
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+        output_stream.write(
+            json.dumps(
+                {
+                    "id": record_id,
+                    "html": html,
+                    "error": error,
+                    "elapsed_ms": elapsed_ms,
+                }
+            )
+            + "\n"
+        )
+        output_stream.flush()
@@ -0,0 +1,121 @@
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sphinx.application import Sphinx
+
+# The warm app is handed to the workers through fork(): the children inherit
+# this global from the parent and share its memory pages copy-on-write.
+_WORKER_APP: Optional[Sphinx] = None
+
+
+def _render_chunk(
+    chunk: Sequence[str], batch_size: int = 1
+) -> Tuple[int, List[str], float]:
+    start_time = time.perf_counter()
+    outputs = _WORKER_APP.builder.render_many(chunk, batch_size=batch_size)
+    return os.getpid(), outputs, time.perf_counter() - start_time
+
+
+class FragmentWorkerPool:
+    """Renders fragments on several cores with pre-forked warm workers.
+
+    The parent process pays for Sphinx, breathe and builder initialization
+    once, then forks the workers. Fragments are dispatched in chunks of
+    chunk_size from a shared queue and the results come back in input order.
+    Each worker renders up to batch_size fragments of a chunk as one
+    document, see MinimalBuilder.render_many().
+    """
+
+    def __init__(
+        self,
+        app: Sphinx,
+        workers: Optional[int] = None,
+        chunk_size: int = 16,
+        batch_size: int = 1,
+    ) -> None:
+        global _WORKER_APP  # pylint: disable=global-statement
+        assert app.builder.name == "minimal"
+        assert chunk_size > 0 and batch_size > 0
+
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.worker_stats: Dict[int, Dict[str, float]] = {}
+
+        _WORKER_APP = app
+        self.pool = multiprocessing.get_context("fork").Pool(self.workers)
+
+    def __enter__(self) -> "FragmentWorkerPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def render_many(self, fragments: Sequence[str]) -> List[str]:
+        chunks = [
+            fragments[i:i + self.chunk_size]
+            for i in range(0, len(fragments), self.chunk_size)
+        ]
+        outputs: List[str] = []
+        render_chunk = functools.partial(
+            _render_chunk, batch_size=self.batch_size
+        )
+        for pid, chunk_outputs, seconds in self.pool.imap(render_chunk, chunks):
+            outputs.extend(chunk_outputs)
+            self._record(pid, chunk_outputs, seconds)
+        return outputs
+
+    def submit(self, fragments: Sequence[str]) -> concurrent.futures.Future:
+        """Render fragments in one worker without waiting for the result.
+
+        The future resolves to the outputs in input order. The work cannot
+        be cancelled once it is submitted.
+        """
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+
+        def on_result(result: Tuple[int, List[str], float]) -> None:
+            pid, outputs, seconds = result
+            self._record(pid, outputs, seconds)
+            future.set_result(outputs)
+
+        self.pool.apply_async(
+            _render_chunk,
+            (fragments, self.batch_size),
+            callback=on_result,
+            error_callback=future.set_exception,
+        )
+        return future
+
+    def _record(self, pid: int, outputs: List[str], seconds: float) -> None:
+        worker_stats = self.worker_stats.setdefault(
+            pid, {"fragments": 0, "seconds": 0.0}
+        )
+        worker_stats["fragments"] += len(outputs)
+        worker_stats["seconds"] += seconds
+
+    def stats(self) -> dict:
+        workers = {}
+        # submit() records results from the pool's result handler thread.
+        for pid, worker_stats in list(self.worker_stats.items()):
+            seconds = worker_stats["seconds"]
+            workers[pid] = {
+                **worker_stats,
+                "fragments_per_second": (
+                    worker_stats["fragments"] / seconds if seconds > 0 else 0.0
+                ),
+            }
+        return {
+            "workers": self.workers,
+            "chunk_size": self.chunk_size,
+            "batch_size": self.batch_size,
+            "per_worker": workers,
+        }
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
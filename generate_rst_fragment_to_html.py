@@ -1,112 +1,493 @@
+import argparse
 import logging
 import os
-import shutil
 import sys
 import time
 
-from breathe import setup
-from sphinx.application import Sphinx
-
-from builders.minimal_builder import MinimalBuilder
-from builders.single_file_html_without_finish import \
-    SingleFileHTMLBuilderWithoutFinish
+from builders.doxygen_index import doxygen_index_supported
+from converter.app import (
+    BUILDERS,
+    MINIMAL_BUILDER_RST,
+    configure_app,
+    create_app,
+    is_in_memory,
+    rebuild,
+    rendered_html,
+)
+from converter.fragment_server import DEFAULT_MAX_MESSAGE_BYTES, serve
+from converter.fragment_stream import stream
 
 # Force Sphinx to produce no logs.
 logging.disable(logging.CRITICAL)
 
 
-def rst_to_html(path_to_rst_tree, path_to_build, selected_builder):
-    srcdir = path_to_rst_tree
-    outdir = os.path.join(path_to_build, "sphinx_html")
-    doctreedir = os.path.join(path_to_build, "doctrees")
-
-    if os.path.exists(doctreedir):
-        shutil.rmtree(doctreedir)
-    if os.path.exists(outdir):
-        shutil.rmtree(outdir)
-
-    confoverrides = {}
-    confoverrides["html_theme"] = "my_theme"
-    confoverrides["html_theme_path"] = ["themes"]
-
-    # Initialize and build the Sphinx application
-    app = Sphinx(
-        srcdir=srcdir,
-        confdir=None,
-        outdir=outdir,
-        doctreedir=doctreedir,
-        confoverrides=confoverrides,
-        buildername="singlehtml"
-    )
-
-    # Register builder.
-    if selected_builder == "single_file_html_without_finish":
-        builder = SingleFileHTMLBuilderWithoutFinish(app, app.env)
-        builder.use_index = False
-        app.registry.builders["single_file_html_without_finish"] = builder
-        app.builder = app.registry.builders["single_file_html_without_finish"]
-    elif selected_builder == "minimal":
-        builder = MinimalBuilder(app, app.env)
-        builder.use_index = False
-        app.registry.builders["minimal"] = builder
-        app.builder = app.registry.builders["minimal"]
-
-        # WIP: This essentially removes all Sphinx smartness.
-        # This may create problems if not commented out.
-        app.registry.transforms.clear()
-
-        rst = """Hello **world**
-
-.. doxygenfile:: imu.h
-   :project: DO-178C
-
-We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
-
-We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
-
-We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
-
-We and our store and/or access information on a device, such as cookies and process personal data, such as unique identifiers and standard information sent by a device for personalised ads and content, ad and content measurement, and audience insights, as well as to develop and improve products. With your permission we and our partners may use precise geolocation data and identification through device scanning. You may click to consent to our and our partners’ processing as described above. Alternatively you may access more detailed information and change your preferences before consenting or to refuse consenting. Please note that some processing of your personal data may not require your consent, but you have a right to object to such processing. Your preferences will apply to this website only. You can change your preferences at any time by returning to this site or visit our privacy policy.
-        """
-        builder.strictdoc_input = rst
-    elif selected_builder == "single_file_html":
-        # Do nothing: We are already using the native singlehtml builder.
-        pass
-    else:
-        raise NotImplementedError
-
-    app.config.breathe_projects = {"DO-178C": "_xml"}
-    app.config.html_sidebars = {
-        '**': [],
-    }
-
-    setup(app=app)
+def rst_to_html(
+    path_to_rst_tree,
+    path_to_build,
+    selected_builder,
+    in_memory=False,
+    parallel=0,
+    **options,
+):
+    incremental = options.get("incremental", False)
+    app = create_app(
+        path_to_rst_tree,
+        path_to_build,
+        selected_builder,
+        in_memory=in_memory,
+        parallel=parallel,
+        incremental=incremental,
+    )
+    features = configure_app(app, **options)
+    if selected_builder == "minimal":
+        app.builder.strictdoc_input = MINIMAL_BUILDER_RST
 
     start_time = time.perf_counter()
 
     for i in range(1):
-        if os.path.exists(doctreedir):
-            shutil.rmtree(doctreedir)
-        if os.path.exists(outdir):
-            shutil.rmtree(outdir)
-
-        app.build(force_all=False)
-        app.env.clear_doc("index")
+        rebuild(app, incremental=incremental)
 
     end_time = time.perf_counter()
     execution_time = end_time - start_time
     print(f"The execution time is: {execution_time}")
 
+    if in_memory:
+        html = rendered_html(app)
+        stats = (
+            app.builder.virtual_store.stats()
+            if is_in_memory(app)
+            else {"files": 0, "bytes": 0}
+        )
+        print(
+            f"In-memory build: {len(html)} characters of HTML, "
+            f"{stats['files']} files ({stats['bytes']} bytes) in the virtual "
+            "store"
+        )
+
+    if options.get("per_document"):
+        outputs = app.builder.outputs
+        print(
+            f"Per-document output: {len(outputs)} documents, "
+            f"{sum(len(body) for body in outputs.values())} characters of HTML"
+        )
 
-assert len(sys.argv) == 4
+    if "incremental" in features:
+        stats = features["incremental"].stats()
+        print(
+            f"Incremental build: {stats['documents_outdated']} outdated, "
+            f"{stats['documents_unchanged']} unchanged "
+            f"({stats['documents_touched']} touched without changes)"
+        )
 
-builder = sys.argv[1]
-assert builder in ["single_file_html", "single_file_html_without_finish", "minimal"]
+    if "targets" in features:
+        stats = features["targets"].stats()
+        print(
+            f"Target index: {stats['documents']} documents, "
+            f"{stats['documents_read']} read, {stats['documents_reused']} "
+            "reused"
+        )
 
-program_name = sys.argv[0]
-path_to_rst_tree = sys.argv[2]
-assert os.path.isdir(path_to_rst_tree)
+    if "doxygen_index" in features:
+        stats = features["doxygen_index"].stats()
+        print(
+            f"Doxygen index: {'compiled' if stats['compiled'] else 'reused'}, "
+            f"{stats['files']} Doxygen XML files, {stats['hits']} read from "
+            f"it, {stats['misses']} parsed"
+        )
+
+    if "fragments" in features:
+        stats = features["fragments"].stats()
+        print(
+            f"Fragment cache: {stats['hits']} hits "
+            f"({stats['disk_hits']} from disk), {stats['misses']} misses"
+        )
+    if "doctrees" in features:
+        stats = features["doctrees"].stats()
+        print(
+            f"Doctree cache: {stats['hits']} hits "
+            f"({stats['disk_hits']} from disk), {stats['misses']} misses"
+        )
+    if "highlight" in features:
+        stats = features["highlight"].stats()
+        print(
+            f"Highlight cache: {stats['hits']} hits "
+            f"({stats['disk_hits']} from disk), {stats['misses']} misses"
+        )
+    if "doxygen_directives" in features:
+        stats = features["doxygen_directives"].stats()
+        print(
+            f"Doxygen directive cache: {stats['hits']} hits, "
+            f"{stats['misses']} misses"
+        )
+    if "blocks" in features:
+        stats = features["blocks"].stats()
+        print(
+            f"Block rendering: {stats['blocks_rendered']} blocks rendered, "
+            f"{stats['blocks_reused']} reused, {stats['full_renders']} full "
+            "renders"
+        )
+    if "phase_timer" in features:
+        print(features["phase_timer"].format_table())
+    if "memory" in features:
+        print(features["memory"].format_table())
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        # Imported here: the other commands do not need it.
+        from converter.benchmark import (  # pylint: disable=import-outside-toplevel
+            main as benchmark_main,
+        )
+
+        benchmark_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Convert a standalone RST fragment to HTML with Sphinx."
+    )
+    parser.add_argument("builder", choices=BUILDERS)
+    parser.add_argument("path_to_rst_tree")
+    parser.add_argument("path_to_build")
+    parser.add_argument(
+        "--serve",
+        metavar="ADDRESS",
+        help=(
+            "Keep the Sphinx app warm and serve fragment requests on ADDRESS: "
+            "a Unix socket path or HOST:PORT. Each connection is handled in "
+            "its own thread; renders take turns on the one app. Requires the "
+            "minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--max-message-bytes",
+        type=int,
+        default=DEFAULT_MAX_MESSAGE_BYTES,
+        metavar="N",
+        help=(
+            "With --serve, answer requests larger than N bytes with an error "
+            "and close the connection."
+        ),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            'Read {"id": ..., "rst": ...} JSON lines from stdin and write '
+            '{"id": ..., "html": ..., "error": ..., "elapsed_ms": ...} JSON '
+            "lines to stdout. Requires the minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "With --stream, read up to N records before rendering them and "
+            "render small fragments among them as one document. The output "
+            "is the same as with N=1."
+        ),
+    )
+    parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help=(
+            "Keep doctrees, the environment pickle, static assets and the "
+            "output page in memory instead of writing them under "
+            "path_to_build."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "Let Sphinx read and write the documents of the project in N "
+            "processes, as with sphinx-build -j. With the minimal builder, "
+            "the documents under --target-project are read in N processes."
+        ),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Keep the environment and doctrees under path_to_build between "
+            "runs and read again only the documents whose source, included "
+            "files or Doxygen XML have changed, by content. Cannot be "
+            "combined with the minimal builder or --in-memory."
+        ),
+    )
+    parser.add_argument(
+        "--per-document",
+        action="store_true",
+        help=(
+            "Write each document of the project on its own, in parallel when "
+            "Sphinx may use several processes, and keep the HTML of every "
+            "document in memory. Requires the single_file_html_without_finish "
+            "builder."
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help=(
+            "Reuse rendered fragments stored in this directory and store new "
+            "ones there. Requires the minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--doctree-cache",
+        metavar="DIR",
+        help=(
+            "Reuse the parsed doctrees of fragments stored in this directory, "
+            "which stay valid across changes to the theme and the other "
+            "output options, and store new ones there. Requires the minimal "
+            "builder."
+        ),
+    )
+    parser.add_argument(
+        "--highlight-cache",
+        metavar="DIR",
+        help=(
+            "Reuse the syntax highlighting of code blocks stored in this "
+            "directory and store newly highlighted code there."
+        ),
+    )
+    parser.add_argument(
+        "--incremental-blocks",
+        action="store_true",
+        help=(
+            "Render fragments block by block and reuse the HTML of the "
+            "blocks that have not changed since an earlier render. Requires "
+            "the minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--target-index",
+        metavar="PATH",
+        help=(
+            "Resolve references in fragments against the labels, objects "
+            "and documents stored in the target index at PATH. Requires the "
+            "minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--target-project",
+        metavar="DIR",
+        help=(
+            "Index the reference targets of the .rst files under DIR, "
+            "reading only new and changed files when --target-index is "
+            "given, and update that index. Requires the minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--doxygen-index",
+        metavar="PATH",
+        help=(
+            "Compile the Doxygen XML of the breathe projects into a binary "
+            "index at PATH and let breathe read from it. Later runs restore "
+            "the parsed XML from the index; it is compiled again only when "
+            "the XML or the Python or breathe version has changed."
+        ),
+    )
+    parser.add_argument(
+        "--memoize-doxygen",
+        action="store_true",
+        help=(
+            "Reuse the nodes produced by a doxygen directive when it occurs "
+            "again with the same arguments and options."
+        ),
+    )
+    parser.add_argument(
+        "--profile-phases",
+        action="store_true",
+        help=(
+            "Print the wall and CPU time spent in each build phase and in "
+            "the doxygen directives. With the minimal builder, also print "
+            "the time spent in each transform, most expensive first."
+        ),
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help=(
+            "Render only the HTML fragment and free every doctree and the "
+            "writer state as soon as the fragment is written. Requires the "
+            "minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--fast-translator",
+        action="store_true",
+        help=(
+            "Write the HTML with a translator that has fast paths for "
+            "common nodes and produces the same HTML. Requires the minimal "
+            "builder."
+        ),
+    )
+    parser.add_argument(
+        "--report-memory",
+        action="store_true",
+        help=(
+            "Trace memory allocations with tracemalloc and print the peak "
+            "memory of the fragments with the highest peaks. Slows rendering "
+            "down. Requires the minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--allow-transform",
+        action="append",
+        metavar="NAME",
+        help=(
+            "Run this transform or environment collector on fragments even "
+            "though it is denied by default. Requires the minimal builder."
+        ),
+    )
+    parser.add_argument(
+        "--deny-transform",
+        action="append",
+        metavar="NAME",
+        help=(
+            "Do not run this transform or environment collector on "
+            'fragments; "*" denies all that are not allowed. Requires the '
+            "minimal builder."
+        ),
+    )
+    args = parser.parse_args()
+
+    assert os.path.isdir(args.path_to_rst_tree)
+
+    if args.incremental and (args.builder == "minimal" or args.in_memory):
+        parser.error(
+            "--incremental cannot be combined with the minimal builder or "
+            "--in-memory"
+        )
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.max_message_bytes < 1:
+        parser.error("--max-message-bytes must be at least 1")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.batch_size != 1 and not args.stream:
+        parser.error("--batch-size requires --stream")
+
+    if args.doxygen_index is not None and not doxygen_index_supported():
+        parser.error("--doxygen-index requires breathe 4")
+
+    if args.per_document and args.builder != "single_file_html_without_finish":
+        parser.error(
+            "--per-document requires the single_file_html_without_finish "
+            "builder"
+        )
+
+    if args.builder != "minimal":
+        if args.serve is not None:
+            parser.error("--serve requires the minimal builder")
+        if args.stream:
+            parser.error("--stream requires the minimal builder")
+        if args.cache_dir is not None:
+            parser.error("--cache-dir requires the minimal builder")
+        if args.doctree_cache is not None:
+            parser.error("--doctree-cache requires the minimal builder")
+        if args.incremental_blocks:
+            parser.error("--incremental-blocks requires the minimal builder")
+        if args.target_index is not None or args.target_project is not None:
+            parser.error(
+                "--target-index and --target-project require the minimal "
+                "builder"
+            )
+        if args.fast_translator:
+            parser.error("--fast-translator requires the minimal builder")
+        if args.low_memory or args.report_memory:
+            parser.error(
+                "--low-memory and --report-memory require the minimal builder"
+            )
+        if args.allow_transform or args.deny_transform:
+            parser.error(
+                "--allow-transform and --deny-transform require the minimal "
+                "builder"
+            )
+
+    options = {
+        "cache_dir": args.cache_dir,
+        "doxygen_index": args.doxygen_index,
+        "memoize_doxygen": args.memoize_doxygen,
+        "profile_phases": args.profile_phases,
+        "allow_transforms": args.allow_transform,
+        "deny_transforms": args.deny_transform,
+        "incremental_blocks": args.incremental_blocks,
+        "low_memory": args.low_memory,
+        "report_memory": args.report_memory,
+        "fast_translator": args.fast_translator,
+        "highlight_cache": args.highlight_cache,
+        "target_index": args.target_index,
+        "target_project": args.target_project,
+        "doctree_cache": args.doctree_cache,
+        "per_document": args.per_document,
+        "incremental": args.incremental,
+    }
+
+    if args.serve is not None:
+        serve(
+            args.path_to_rst_tree,
+            args.path_to_build,
+            args.serve,
+            parallel=args.jobs,
+            max_message_bytes=args.max_message_bytes,
+            **options,
+        )
+        return
+
+    if args.stream:
+        app = create_app(
+            args.path_to_rst_tree,
+            args.path_to_build,
+            "minimal",
+            parallel=args.jobs,
+        )
+        features = configure_app(app, **options)
+        # Line-buffered in both directions: each record is read and written
+        # as soon as it is complete.
+        input_stream = open(  # pylint: disable=consider-using-with
+            sys.stdin.fileno(), encoding="utf-8", closefd=False, buffering=1
+        )
+        output_stream = open(  # pylint: disable=consider-using-with
+            sys.stdout.fileno(), "w", encoding="utf-8", closefd=False,
+            buffering=1,
+        )
+        stream(app, input_stream, output_stream, batch_size=args.batch_size)
+        # Summed over the whole input, on stderr to keep stdout JSON.
+        if "blocks" in features:
+            stats = features["blocks"].stats()
+            print(
+                f"Block rendering: {stats['blocks_rendered']} blocks "
+                f"rendered, {stats['blocks_reused']} reused, "
+                f"{stats['full_renders']} full renders",
+                file=sys.stderr,
+            )
+        if "highlight" in features:
+            stats = features["highlight"].stats()
+            print(
+                f"Highlight cache: {stats['hits']} hits "
+                f"({stats['disk_hits']} from disk), {stats['misses']} misses",
+                file=sys.stderr,
+            )
+        if "phase_timer" in features:
+            print(features["phase_timer"].format_table(), file=sys.stderr)
+        if "memory" in features:
+            print(features["memory"].format_table(), file=sys.stderr)
+        return
+
+    rst_to_html(
+        args.path_to_rst_tree,
+        args.path_to_build,
+        args.builder,
+        in_memory=args.in_memory,
+        parallel=args.jobs,
+        **options,
+    )
 
-path_to_build = sys.argv[3]
 
-rst_to_html(path_to_rst_tree, path_to_build, builder)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app  # noqa: E402
+from converter.async_renderer import (  # noqa: E402
+    AsyncFragmentRenderer,
+    RendererOverloaded,
+)
+
+logging.disable(logging.CRITICAL)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+
+fragments = [f"Fragment **{i}**" for i in range(20)]
+expected = app.builder.render_many(fragments)
+
+
+async def main(renderer: AsyncFragmentRenderer) -> None:
+    tasks = [
+        asyncio.create_task(renderer.render(fragment))
+        for fragment in fragments
+    ]
+    # Let every task start: one is rendering, the others wait for a slot.
+    await asyncio.sleep(0)
+    stats = renderer.stats()
+    print(f"in flight: {stats['in_flight']}, queued: {stats['queued']}")
+
+    tasks[10].cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    print(results[0])
+    print(f"cancelled: {type(results[10]).__name__}")
+    del results[10], expected[10]
+    print(f"identical: {results == expected}")
+
+    renderer.max_queue = 3
+    results = await asyncio.gather(
+        *(renderer.render(fragment) for fragment in fragments[:10]),
+        return_exceptions=True,
+    )
+    overloaded = sum(isinstance(result, RendererOverloaded) for result in results)
+    print(f"overloaded: {overloaded}")
+
+    stats = renderer.stats()
+    print(
+        f"completed: {stats['completed']}, cancelled: {stats['cancelled']}, "
+        f"rejected: {stats['rejected']}, in flight: {stats['in_flight']}, "
+        f"queued: {stats['queued']}"
+    )
+
+
+with AsyncFragmentRenderer(app) as renderer:
+    asyncio.run(main(renderer))
@@ -0,0 +1,43 @@
+import logging
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import (  # noqa: E402
+    MINIMAL_BUILDER_RST,
+    create_app,
+    enable_block_rendering,
+)
+
+logging.disable(logging.CRITICAL)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+
+paragraphs = [f"Paragraph **{i}**." for i in range(20)]
+edited_paragraphs = list(paragraphs)
+edited_paragraphs[7] = "Paragraph *seven*."
+fragments = [
+    MINIMAL_BUILDER_RST,
+    "\n\n".join(paragraphs),
+    "\n\n".join(edited_paragraphs),
+    "Lists:\n\n- first\n\n- second\n\nThen:\n\n1. one\n\n2. two\n",
+    "Title\n=====\n\nText [#]_\n\n.. [#] A footnote.\n",
+    ".. c:function:: int f(void)\n\nCalls :c:func:`f`.\n",
+]
+expected = app.builder.render_many(fragments)
+
+block_renderer = enable_block_rendering(app)
+outputs = []
+for fragment in fragments:
+    before = block_renderer.stats()
+    outputs.extend(app.builder.render_many([fragment]))
+    after = block_renderer.stats()
+    print(
+        f"rendered: {after['blocks_rendered'] - before['blocks_rendered']}, "
+        f"reused: {after['blocks_reused'] - before['blocks_reused']}, "
+        f"full: {after['full_renders'] - before['full_renders']}"
+    )
+
+print(f"identical: {outputs == expected}")
@@ -0,0 +1,55 @@
+import logging
+import os
+import shutil
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import configure_app, create_app  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+# A project with enough documents for Sphinx to read and write in parallel.
+path_to_project = f"{path_to_build}/project"
+shutil.rmtree(path_to_project, ignore_errors=True)
+shutil.copytree(
+    f"{project_root}/rst/themes", f"{path_to_project}/themes"
+)
+docnames = [f"chapter{number}" for number in range(8)]
+with open(f"{path_to_project}/index.rst", "w", encoding="utf-8") as file:
+    file.write("Manual\n======\n\n.. toctree::\n\n")
+    file.writelines(f"   {docname}\n" for docname in docnames)
+    file.write("\nStart with :doc:`chapter0`.\n")
+for number, docname in enumerate(docnames):
+    with open(
+        f"{path_to_project}/{docname}.rst", "w", encoding="utf-8"
+    ) as file:
+        next_docname = docnames[(number + 1) % len(docnames)]
+        file.write(
+            f".. _{docname}:\n\nChapter {number}\n==========\n\n"
+            f"Text with **markup**, see :ref:`{next_docname}`.\n"
+        )
+
+
+def build(parallel):
+    app = create_app(
+        path_to_project,
+        os.path.join(path_to_build, f"build{parallel}"),
+        "single_file_html_without_finish",
+        parallel=parallel,
+    )
+    configure_app(app, per_document=True)
+    app.build()
+    return app.builder
+
+
+serial = build(0)
+parallel = build(2)
+print(f"documents: {sorted(serial.outputs)}")
+print(f"parallel write: {parallel.parallel_ok}")
+print(f"identical: {parallel.outputs == serial.outputs}")
+print(f"root document: {serial.output == serial.outputs['index']}")
+print(serial.outputs["index"])
+print(serial.outputs["chapter2"])
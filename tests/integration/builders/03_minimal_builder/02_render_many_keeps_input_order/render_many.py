@@ -0,0 +1,21 @@
+import logging
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+
+fragments = [
+    "First **fragment**",
+    ".. c:function:: int imu_read(void)",
+    "Second *fragment*",
+    ".. c:function:: int imu_read(void)",
+]
+for html in app.builder.render_many(fragments):
+    print(html)
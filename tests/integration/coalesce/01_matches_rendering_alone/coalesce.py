@@ -0,0 +1,51 @@
+import logging
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import MINIMAL_BUILDER_RST, create_app  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+
+fragments = [
+    "Hello **world**",
+    "- first\n- second\n",
+    # Would swallow the boundary after it.
+    "Expanded::",
+    "   A block quote.",
+    ".. note:: A note.",
+    "Term\n   Definition",
+    "",
+    # Numbered ids.
+    "Unclosed *emphasis",
+    ".. code-block:: c\n\n   int x;\n",
+    # Metadata at the start of a document.
+    ":field: value",
+    # The second declaration has no id after the first.
+    ".. c:function:: void f()",
+    ".. c:function:: void f()",
+    "Calls :c:func:`f`.",
+    "Title\n=====\n\nA section.",
+    MINIMAL_BUILDER_RST,
+    'Smart "quotes".',
+]
+expected = app.builder.render_many(fragments)
+
+for batch_size in [2, 5, 100]:
+    outputs = app.builder.render_many(fragments, batch_size=batch_size)
+    print(f"batch size {batch_size}: identical: {outputs == expected}")
+
+stats = app.builder.coalescer.stats()
+print(f"batches: {stats['batches']}")
+print(f"coalesced: {stats['fragments_coalesced'] > 0}")
+print(f"failed batches: {stats['failed_batches']}")
+
+sentences = [f"Sentence *{i}*." for i in range(50)]
+expected = app.builder.render_many(sentences)
+outputs = app.builder.render_many(sentences, batch_size=16)
+print(f"sentences identical: {outputs == expected}")
+print(f"batches: {app.builder.coalescer.stats()['batches'] - stats['batches']}")
@@ -4,15 +4,18 @@ import sys
 
 if len(sys.argv) == 1 or len(sys.argv) != 3:
     print(  # noqa: T201
-        "error: expect two arguments: input file and output file."
+        "error: expect two arguments: input path and output path."
     )
     sys.exit(1)
 
-input_file = sys.argv[1]
-if not os.path.isfile(input_file):
-    print(f"error: is not a file: {input_file}")  # noqa: T201
-    sys.exit(1)
-
-output_file = sys.argv[2]
+input_path = sys.argv[1]
+output_path = sys.argv[2]
 
-shutil.copy(input_file, output_file)
+if os.path.isdir(input_path):
+    # The output directory must not exist yet.
+    shutil.copytree(input_path, output_path)
+elif os.path.isfile(input_path):
+    shutil.copy(input_path, output_path)
+else:
+    print(f"error: is not a file or directory: {input_path}")  # noqa: T201
+    sys.exit(1)
@@ -0,0 +1,72 @@
+import logging
+import shutil
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app, enable_doctree_cache  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+path_to_cache = f"{path_to_build}/doctree_cache"
+shutil.rmtree(path_to_cache, ignore_errors=True)
+
+fragments = [
+    "Hello *world*, see :c:func:`f`.\n\n.. c:function:: void f(int x)\n",
+    "Title\n=====\n\nText [#]_ and [CIT]_.\n\n.. [#] A footnote.\n\n"
+    ".. [CIT] A citation.\n\n.. _label:\n\nSee :ref:`label`.\n",
+    ".. code-block:: python\n\n   def f(x):\n       return x + 1\n",
+]
+
+
+def render(configure=None):
+    app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+    if configure is not None:
+        configure(app.config)
+    expected = app.builder.render_many(fragments)
+    doctree_cache = enable_doctree_cache(app, path_to_cache)
+    outputs = app.builder.render_many(fragments)
+    print(f"identical: {outputs == expected}")
+    outputs = app.builder.render_many(fragments)
+    print(f"identical: {outputs == expected}")
+    stats = doctree_cache.stats()
+    print(
+        f"memory hits: {stats['memory_hits']}, "
+        f"disk hits: {stats['disk_hits']}, misses: {stats['misses']}"
+    )
+
+
+render()
+
+
+# Writer options leave the cached doctrees valid.
+def change_writer(config):
+    config.html_theme_options = {"nosidebar": True}
+    config.html_codeblock_linenos_style = "table"
+
+
+render(change_writer)
+
+
+# Reader options do not.
+def change_reader(config):
+    config.rst_prolog = ".. |version| replace:: 2.0"
+
+
+render(change_reader)
+
+
+# A fragment that includes another file is read again after that file has
+# changed.
+path_to_rst_tree = f"{path_to_build}/rst"
+shutil.rmtree(path_to_rst_tree, ignore_errors=True)
+shutil.copytree(f"{project_root}/rst", path_to_rst_tree)
+app = create_app(path_to_rst_tree, path_to_build, "minimal")
+doctree_cache = enable_doctree_cache(app, path_to_cache)
+for version in ("First", "Second"):
+    with open(f"{path_to_rst_tree}/included.txt", "w", encoding="utf8") as file:
+        file.write(f"{version} version.\n")
+    print(app.builder.render_many([".. include:: included.txt\n"])[0], end="")
+print(f"uncached: {doctree_cache.stats()['uncached']}")
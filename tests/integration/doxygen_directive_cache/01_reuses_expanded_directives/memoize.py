@@ -0,0 +1,121 @@
+import logging
+import os
+import shutil
+import sys
+import time
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import configure_app, create_app, rebuild  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+fragments = [
+    ".. doxygenfile:: imu.h\n   :project: DO-178C\n",
+    ".. doxygenstruct:: a429_t\n   :project: DO-178C\n   :members:\n",
+] * 3
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+expected = app.builder.render_many(fragments)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+caches = configure_app(app, memoize_doxygen=True)
+outputs = app.builder.render_many(fragments)
+
+print(f"identical: {outputs == expected}")
+print(caches["doxygen_directives"].stats())
+
+# Up to max_entries entries are kept.
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+caches = configure_app(app, memoize_doxygen=True)
+caches["doxygen_directives"].max_entries = 1
+outputs = app.builder.render_many(fragments)
+print(f"evicted: {outputs == expected}")
+print(caches["doxygen_directives"].stats())
+
+# Inside a namespace, the declarations are nested in it, so the directive
+# runs uncached.
+SEE_ALSO = "\nSee :cpp:struct:`a429_t`.\n"
+scoped_fragments = [
+    f".. cpp:namespace:: outer\n\n{fragments[1]}{SEE_ALSO}",
+    f"{fragments[1]}{SEE_ALSO}",
+    f".. c:namespace:: outer\n\n{fragments[0]}",
+    fragments[0],
+] * 2
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+expected = app.builder.render_many(scoped_fragments)
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+caches = configure_app(app, memoize_doxygen=True)
+outputs = app.builder.render_many(scoped_fragments)
+print(f"scoped: {outputs == expected}")
+print(caches["doxygen_directives"].stats())
+
+# A directive that moves to another document is a hit, and the objects it
+# declares belong to the new document. While they are still declared in
+# another document, the directive runs uncached and reports the duplicate.
+path_to_project = f"{path_to_build}/project"
+shutil.rmtree(path_to_project, ignore_errors=True)
+shutil.copytree(f"{project_root}/rst", path_to_project)
+DIRECTIVE = ".. doxygenstruct:: a429_t\n   :project: DO-178C\n\n"
+
+
+def write_project(directives):
+    with open(f"{path_to_project}/index.rst", "w", encoding="utf-8") as file:
+        file.write("Manual\n======\n\n.. toctree::\n\n")
+        file.writelines(f"   {docname}\n" for docname in directives)
+    for docname, directive in directives.items():
+        path_to_rst = f"{path_to_project}/{docname}.rst"
+        with open(path_to_rst, "w", encoding="utf-8") as file:
+            file.write(
+                f"{docname}\n========\n\n{directive}"
+                "See :cpp:struct:`a429_t`.\n"
+            )
+        # Newer than the last read, whatever the file system's resolution.
+        os.utime(path_to_rst, (time.time() + 10, time.time() + 10))
+
+
+def build(name, memoize_doxygen):
+    app = create_app(
+        path_to_project,
+        f"{path_to_build}/{name}",
+        "single_file_html_without_finish",
+    )
+    caches = configure_app(
+        app, memoize_doxygen=memoize_doxygen, per_document=True
+    )
+    return app, caches
+
+
+def declared_in(app):
+    root_symbol = app.env.domaindata["cpp"]["root_symbol"]
+    return sorted(
+        {
+            symbol.docname
+            for symbol in root_symbol.get_all_symbols()
+            if symbol.docname is not None
+        }
+    )
+
+
+write_project({"chapter1": DIRECTIVE, "chapter2": ""})
+app, caches = build("memoized", memoize_doxygen=True)
+rebuild(app)
+write_project({"chapter1": "", "chapter2": DIRECTIVE})
+rebuild(app, incremental=True)
+outputs = dict(app.builder.outputs)
+
+expected_app, _ = build("plain", memoize_doxygen=False)
+rebuild(expected_app)
+print(f"moved: {outputs == dict(expected_app.builder.outputs)}")
+print(f"declared in: {declared_in(app)}")
+print(caches["doxygen_directives"].stats())
+
+write_project({"chapter1": DIRECTIVE, "chapter2": DIRECTIVE})
+app, caches = build("memoized", memoize_doxygen=True)
+rebuild(app)
+expected_app, _ = build("plain", memoize_doxygen=False)
+rebuild(expected_app)
+print(f"duplicate: {app.builder.outputs == expected_app.builder.outputs}")
+print(caches["doxygen_directives"].stats())
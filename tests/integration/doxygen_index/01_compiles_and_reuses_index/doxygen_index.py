@@ -0,0 +1,41 @@
+import logging
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import (  # noqa: E402
+    MINIMAL_BUILDER_RST,
+    create_app,
+    enable_doxygen_index,
+    rebuild,
+)
+
+logging.disable(logging.CRITICAL)
+
+path_to_index = f"{path_to_build}/doxygen.index"
+
+
+def render(builder, doxygen_index=False):
+    app = create_app(f"{project_root}/rst", path_to_build, builder)
+    features = {}
+    if doxygen_index:
+        features["doxygen_index"] = enable_doxygen_index(app, path_to_index)
+    if builder == "minimal":
+        output = app.builder.render_many([MINIMAL_BUILDER_RST])[0]
+    else:
+        rebuild(app)
+        output = app.builder.output
+    return output, features
+
+
+for builder in ("minimal", "single_file_html_without_finish"):
+    expected, _ = render(builder)
+    output, features = render(builder, doxygen_index=True)
+    stats = features["doxygen_index"].stats()
+    print(
+        f"{builder}: identical: {output == expected}, "
+        f"compiled: {stats['compiled']}, hits: {stats['hits']}, "
+        f"misses: {stats['misses']}"
+    )
@@ -0,0 +1,36 @@
+import difflib
+import logging
+import os
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+path_to_corpus = sys.argv[3]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+
+filenames = sorted(os.listdir(path_to_corpus))
+fragments = []
+for filename in filenames:
+    with open(os.path.join(path_to_corpus, filename), encoding="utf-8") as file:
+        fragments.append(file.read())
+
+expected = app.builder.render_many(fragments)
+app.builder.fast_translator = True
+outputs = app.builder.render_many(fragments)
+
+for filename, output, expected_output in zip(filenames, outputs, expected):
+    verdict = "identical" if output == expected_output else "DIFFERENT"
+    print(f"{filename}: {verdict}")
+    if output != expected_output:
+        sys.stdout.writelines(
+            difflib.unified_diff(
+                expected_output.splitlines(keepends=True),
+                output.splitlines(keepends=True),
+            )
+        )
@@ -0,0 +1,46 @@
+import logging
+import shutil
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app, enable_highlight_cache  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+path_to_cache = f"{path_to_build}/highlight_cache"
+shutil.rmtree(path_to_cache, ignore_errors=True)
+
+fragments = [
+    ".. code-block:: python\n\n   def f(x):\n       return x + 1\n",
+    ".. code-block:: c\n   :linenos:\n   :emphasize-lines: 2\n\n"
+    "   int main(void) {\n       return 0;\n   }\n",
+    ".. code-block:: python\n\n   def f(x):\n       return x + 1\n\n"
+    ".. code-block:: json\n\n   {\"a\": [1, 2]}\n",
+    # No lexer, and code that does not lex: highlighted every time.
+    ".. code-block:: no-such-language\n\n   x\n",
+    ".. code-block:: json\n\n   {\"a\": @}\n",
+]
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+expected = app.builder.render_many(fragments)
+
+highlighter = enable_highlight_cache(app, path_to_cache)
+outputs = app.builder.render_many(fragments)
+print(f"identical: {outputs == expected}")
+print(f"first run: {highlighter.stats()}")
+
+outputs = app.builder.render_many(fragments)
+stats = highlighter.stats()
+print(f"identical: {outputs == expected}")
+print(f"hits: {stats['memory_hits']}, misses: {stats['misses']}")
+
+# A new app reads what the first one highlighted from disk.
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+highlighter = enable_highlight_cache(app, path_to_cache)
+outputs = app.builder.render_many(fragments)
+stats = highlighter.stats()
+print(f"identical: {outputs == expected}")
+print(f"disk hits: {stats['disk_hits']}, misses: {stats['misses']}")
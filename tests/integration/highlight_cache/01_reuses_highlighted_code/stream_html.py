@@ -0,0 +1,10 @@
+import json
+import sys
+
+# The HTML of every record that --stream wrote, without the timings, which
+# differ between runs.
+with open(sys.argv[1], encoding="utf-8") as file:
+    for line in file:
+        record = json.loads(line)
+        print(f"{record['id']}: {record['error']}")
+        print(record["html"])
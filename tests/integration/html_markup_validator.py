@@ -1,103 +1,269 @@
 import argparse
+import glob
+import json
+import math
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from io import StringIO
+from typing import Dict, List, Tuple
 from xml.etree import ElementTree as etree
 
 import html5lib
 from tidylib import tidy_document
 
-parser = argparse.ArgumentParser(description="HTML Markup validator")
-parser.add_argument("input_file", type=str, help="Path to HTML file")
-args = parser.parse_args()
-
-input_file = args.input_file
-if not os.path.isfile(input_file):
-    sys.stdout.flush()
-    err = (
-        f"error: html_markup_validator: input file does not exist: {input_file}"
-    )
-    print(err)  # noqa: T201
-    exit(1)
+MESSAGE_PREFIX = "HTML markup validation COMPLETED"
 
-with open(input_file, encoding="utf8") as file:
-    html_content = file.read()
+TIDY_OPTIONS = {
+    "new-blocklevel-tags": (
+        # HTML 5
+        "main, aside, header, footer, section, article, nav, menu, "
+        # Turbo.js
+        "turbo-frame, "
+        # SVG
+        "svg, path, line, circle, polyline, "
+        # StrictDoc
+        "sdoc-anchor, "
+        "sdoc-menu, sdoc-menu-handler, sdoc-menu-list, "
+        "sdoc-node, "
+        "sdoc-node-controls, "
+        "sdoc-requirement, "
+        "sdoc-requirement-uid, "
+        "sdoc-requirement-title, "
+        "sdoc-requirement-field, "
+        "sdoc-requirement-field-label, "
+        "sdoc-section, "
+        "sdoc-section-title, sdoc-section-text, "
+        "sdoc-main-placeholder, "
+    ),
+    "char-encoding": "utf8",
+    "input-encoding": "utf8",
+    "output-encoding": "utf8",
+    "drop-proprietary-attributes": "no",
+    "show-warnings": False,
+}
 
-errors = []
-warnings = []
 
 # Validation #1: html5parser
-html5parser = html5lib.HTMLParser(strict=True)
-try:
-    html5parser.parse(html_content)
-except Exception as e:
-    errors.append(f"Error: {str(e)}")
+def validate_html5lib(html_content, errors, warnings):
+    html5parser = html5lib.HTMLParser(strict=True)
+    try:
+        html5parser.parse(html_content)
+    except Exception as e:
+        errors.append(f"Error: {str(e)}")
+
 
 # Validation #2: tidylib
-_, tidylib_messages_string = tidy_document(
-    html_content,
-    options={
-        "new-blocklevel-tags": (
-            # HTML 5
-            "main, aside, header, footer, section, article, nav, menu, "
-            # Turbo.js
-            "turbo-frame, "
-            # SVG
-            "svg, path, line, circle, polyline, "
-            # StrictDoc
-            "sdoc-anchor, "
-            "sdoc-menu, sdoc-menu-handler, sdoc-menu-list, "
-            "sdoc-node, "
-            "sdoc-node-controls, "
-            "sdoc-requirement, "
-            "sdoc-requirement-uid, "
-            "sdoc-requirement-title, "
-            "sdoc-requirement-field, "
-            "sdoc-requirement-field-label, "
-            "sdoc-section, "
-            "sdoc-section-title, sdoc-section-text, "
-            "sdoc-main-placeholder, "
-        ),
-        "char-encoding": "utf8",
-        "input-encoding": "utf8",
-        "output-encoding": "utf8",
-        "drop-proprietary-attributes": "no",
-        "show-warnings": False,
-    },
-)
-
-for message in tidylib_messages_string.split("\n"):
-    if "Error: " in message:
-        errors.append(message)
-    elif "Warning: " in message:
-        warnings.append(message)
+def validate_tidylib(html_content, errors, warnings):
+    _, tidylib_messages_string = tidy_document(
+        html_content, options=TIDY_OPTIONS
+    )
+    for message in tidylib_messages_string.split("\n"):
+        if "Error: " in message:
+            errors.append(message)
+        elif "Warning: " in message:
+            warnings.append(message)
+
 
 # Validation #3: xml.etree
-try:
-    etree.parse(StringIO(html_content), etree.XMLParser())
-except Exception as e:
-    errors.append(f"Error: {str(e)}")
+def validate_xml(html_content, errors, warnings):
+    try:
+        etree.parse(StringIO(html_content), etree.XMLParser())
+    except Exception as e:
+        errors.append(f"Error: {str(e)}")
 
-MESSAGE_PREFIX = "HTML markup validation COMPLETED"
 
-if len(errors) > 0 or len(warnings) > 0:
-    for message in warnings + errors:
-        print(message)  # noqa: T201
+VALIDATORS = [validate_html5lib, validate_tidylib, validate_xml]
+
+# expat and libtidy are C libraries; html5lib is pure Python and takes about
+# 40 times as long as expat on a 17 KB page.
+VALIDATORS_CHEAPEST_FIRST = [validate_xml, validate_tidylib, validate_html5lib]
+
+
+def validate_file(input_file: str, fail_fast: bool = False) -> Dict:
+    """Run the validators on input_file; with fail_fast, cheapest first and
+    only until one reports an error."""
+    with open(input_file, encoding="utf8") as file:
+        html_content = file.read()
+
+    errors: List[str] = []
+    warnings: List[str] = []
+    validators = VALIDATORS_CHEAPEST_FIRST if fail_fast else VALIDATORS
+    for validator in validators:
+        validator(html_content, errors, warnings)
+        if fail_fast and len(errors) > 0:
+            break
+    return {"file": input_file, "errors": errors, "warnings": warnings}
+
+
+def validate_files(input_files: List[str], fail_fast: bool) -> List[Dict]:
+    results = []
+    for input_file in input_files:
+        result = validate_file(input_file, fail_fast)
+        results.append(result)
+        if fail_fast and len(result["errors"]) > 0:
+            break
+    return results
+
+
+def validate_all(
+    input_files: List[str], jobs: int, fail_fast: bool
+) -> List[Dict]:
+    """Validate input_files in chunks across jobs processes. Returns the
+    results in the order of input_files; with fail_fast, the files after
+    the first error may have no result."""
+    if jobs == 1 or len(input_files) == 1:
+        return validate_files(input_files, fail_fast)
+
+    # Several chunks per process balance files of different sizes, and
+    # each chunk pays the cost of a task once.
+    chunk_size = max(1, min(64, math.ceil(len(input_files) / (jobs * 4))))
+    chunks = [
+        input_files[start : start + chunk_size]
+        for start in range(0, len(input_files), chunk_size)
+    ]
+    results_by_file = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(validate_files, chunk, fail_fast)
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            chunk_results = future.result()
+            for result in chunk_results:
+                results_by_file[result["file"]] = result
+            if fail_fast and any(
+                len(result["errors"]) > 0 for result in chunk_results
+            ):
+                # What shutdown(cancel_futures=True) does since Python 3.9.
+                for pending_future in futures:
+                    pending_future.cancel()
+                break
+    return [
+        results_by_file[input_file]
+        for input_file in input_files
+        if input_file in results_by_file
+    ]
 
-    if len(errors) > 0:
-        print(  # noqa: T201
-            "{}: {}: {} errors, {} warnings".format(
-                MESSAGE_PREFIX, input_file, len(errors), len(warnings)
+
+def collect_input_files(inputs: List[str]) -> Tuple[List[str], List[str]]:
+    """The HTML files that inputs name, directly, as a directory to search
+    or as a glob pattern, and the inputs that name none."""
+    input_files = []
+    missing = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            for dirpath, dirnames, filenames in os.walk(input_path):
+                dirnames.sort()
+                input_files.extend(
+                    os.path.join(dirpath, filename)
+                    for filename in sorted(filenames)
+                    if filename.endswith(".html")
+                )
+        elif os.path.isfile(input_path):
+            input_files.append(input_path)
+        elif glob.has_magic(input_path):
+            matches = sorted(
+                path
+                for path in glob.glob(input_path, recursive=True)
+                if os.path.isfile(path)
             )
-        )
+            if len(matches) == 0:
+                missing.append(input_path)
+            input_files.extend(matches)
+        else:
+            missing.append(input_path)
+    # A file that several inputs name is validated once.
+    return list(dict.fromkeys(input_files)), missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML Markup validator")
+    parser.add_argument(
+        "input_files",
+        nargs="+",
+        metavar="input_file",
+        help=(
+            "Path to HTML file, to a directory to search for .html files, or "
+            "a glob pattern"
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes to validate files in",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help=(
+            "Run the validators cheapest first and stop at the first error"
+        ),
+    )
+    parser.add_argument(
+        "--report",
+        metavar="PATH",
+        help="Write a JSON report of all files to PATH, - for stdout",
+    )
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    input_files, missing = collect_input_files(args.input_files)
+    if len(missing) > 0:
+        sys.stdout.flush()
+        for input_file in missing:
+            err = (
+                "error: html_markup_validator: input file does not exist: "
+                f"{input_file}"
+            )
+            print(err)  # noqa: T201
         exit(1)
-    else:
-        # Warnings are ok for now.
-        print(  # noqa: T201
-            "{}: {}: {} errors, {} warnings".format(
-                MESSAGE_PREFIX, input_file, len(errors), len(warnings)
+
+    results = validate_all(input_files, args.jobs, args.fail_fast)
+
+    # With a report on stdout, it is the only output.
+    if args.report != "-":
+        for result in results:
+            errors, warnings = result["errors"], result["warnings"]
+            for message in warnings + errors:
+                print(message)  # noqa: T201
+            # Warnings are ok for now.
+            print(  # noqa: T201
+                "{}: {}: {} errors, {} warnings".format(
+                    MESSAGE_PREFIX, result["file"], len(errors), len(warnings)
+                )
             )
-        )
-        exit(0)
-else:
-    print(f"{MESSAGE_PREFIX}: {input_file}: 0 errors, 0 warnings")  # noqa: T201
+
+    failed = [result for result in results if len(result["errors"]) > 0]
+    if args.report is not None:
+        validated = {result["file"] for result in results}
+        report = {
+            "files": results,
+            "skipped": [
+                input_file
+                for input_file in input_files
+                if input_file not in validated
+            ],
+            "summary": {
+                "files": len(results),
+                "failed": len(failed),
+                "errors": sum(len(result["errors"]) for result in results),
+                "warnings": sum(
+                    len(result["warnings"]) for result in results
+                ),
+            },
+        }
+        if args.report == "-":
+            json.dump(report, sys.stdout, indent=2)
+            print()  # noqa: T201
+        else:
+            with open(args.report, "w", encoding="utf8") as file:
+                json.dump(report, file, indent=2)
+
+    exit(1 if len(failed) > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
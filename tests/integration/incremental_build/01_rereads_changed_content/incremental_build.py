@@ -0,0 +1,103 @@
+import logging
+import os
+import shutil
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import configure_app, create_app, rebuild  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+path_to_project = f"{path_to_build}/project"
+shutil.rmtree(path_to_project, ignore_errors=True)
+for name in ("incremental", "per_document"):
+    shutil.rmtree(f"{path_to_build}/{name}", ignore_errors=True)
+shutil.copytree(f"{project_root}/rst/themes", f"{path_to_project}/themes")
+shutil.copytree(f"{project_root}/rst/_xml", f"{path_to_project}/_xml")
+
+
+def write(filename, text):
+    with open(f"{path_to_project}/{filename}", "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+write(
+    "index.rst",
+    "Manual\n======\n\n.. toctree::\n\n   intro\n   api\n   notes\n",
+)
+write("intro.rst", "Intro\n=====\n\n.. include:: shared.txt\n")
+write("shared.txt", "Shared text.\n")
+write("api.rst", "API\n===\n\n.. doxygenfile:: imu.h\n   :project: DO-178C\n")
+write("notes.rst", "Notes\n=====\n\nSome notes.\n")
+
+
+def build(name, incremental, per_document=False):
+    app = create_app(
+        path_to_project,
+        f"{path_to_build}/{name}",
+        "single_file_html_without_finish",
+        incremental=incremental,
+    )
+    features = configure_app(
+        app, per_document=per_document, incremental=incremental
+    )
+    read = []
+    app.connect(
+        "env-before-read-docs",
+        lambda app, env, docnames: read.extend(docnames),
+    )
+    written = []
+    write_doc = app.builder.write_doc
+    app.builder.write_doc = lambda docname, doctree: (
+        written.append(docname),
+        write_doc(docname, doctree),
+    )
+    rebuild(app, incremental=incremental)
+    if incremental:
+        stats = features["incremental"].stats()
+        print(
+            f"{name}: read {sorted(read)}, "
+            f"outdated {stats['documents_outdated']}, "
+            f"unchanged {stats['documents_unchanged']}, "
+            f"touched {stats['documents_touched']}"
+        )
+        if per_document:
+            print(f"written {sorted(written)}")
+    return dict(app.builder.outputs)
+
+
+def check(name, per_document=False):
+    outputs = build(name, True, per_document)
+    expected = build(f"{name}_fresh", False, per_document)
+    print(f"identical: {outputs == expected}")
+
+
+check("incremental")
+check("incremental")
+
+# A git checkout changes the modification time, not the content.
+os.utime(f"{path_to_project}/notes.rst")
+check("incremental")
+
+# Included files are dependencies.
+write("shared.txt", "Changed shared text.\n")
+check("incremental")
+
+# A CI cache restore can give changed content an older time.
+stat = os.stat(f"{path_to_project}/notes.rst")
+write("notes.rst", "Notes\n=====\n\nOther notes.\n")
+os.utime(f"{path_to_project}/notes.rst", ns=(stat.st_atime_ns, 0))
+check("incremental")
+
+# Documents with doxygen directives depend on the Doxygen XML.
+with open(f"{path_to_project}/_xml/imu_8h.xml", "a", encoding="utf-8") as file:
+    file.write("\n")
+check("incremental")
+
+# In the per-document mode, only what was read again is written.
+check("per_document", per_document=True)
+write("notes.rst", "Notes\n=====\n\nNew notes.\n")
+check("per_document", per_document=True)
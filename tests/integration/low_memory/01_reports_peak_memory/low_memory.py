@@ -0,0 +1,43 @@
+import logging
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import (  # noqa: E402
+    MINIMAL_BUILDER_RST,
+    create_app,
+    enable_memory_report,
+)
+
+logging.disable(logging.CRITICAL)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+
+fragments = [
+    MINIMAL_BUILDER_RST,
+    "\n\n".join(f"Paragraph **{i}**." for i in range(200)),
+    "Title\n=====\n\n- first\n- second\n",
+]
+expected = app.builder.render_many(fragments)
+
+memory_report = enable_memory_report(app)
+app.builder.render_many(fragments)
+app.builder.low_memory = True
+outputs = app.builder.render_many(fragments)
+
+print(f"identical: {outputs == expected}")
+print(f"doctree released: {app.builder.doctree is None}")
+print(
+    "source released: "
+    f"{app.builder.render_context.publisher.reader.input is None}"
+)
+
+per_fragment = memory_report.stats()["per_fragment"]
+print(f"fragments measured: {len(per_fragment)}")
+print(
+    "retains less: "
+    f"{per_fragment[4]['retained_bytes'] < per_fragment[1]['retained_bytes']}"
+)
+print(memory_report.format_table(limit=1))
@@ -0,0 +1,97 @@
+import logging
+import os
+import shutil
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import (  # noqa: E402
+    configure_app,
+    create_app,
+    rebuild,
+    rendered_html,
+)
+
+logging.disable(logging.CRITICAL)
+
+# More documents than Sphinx reads serially.
+path_to_project = f"{path_to_build}/project"
+shutil.rmtree(path_to_project, ignore_errors=True)
+shutil.copytree(
+    f"{project_root}/rst/themes", f"{path_to_project}/themes"
+)
+docnames = [f"chapter{number}" for number in range(8)]
+with open(f"{path_to_project}/index.rst", "w", encoding="utf-8") as file:
+    file.write("Manual\n======\n\n.. toctree::\n\n")
+    file.writelines(f"   {docname}\n" for docname in docnames)
+for number, docname in enumerate(docnames):
+    with open(
+        f"{path_to_project}/{docname}.rst", "w", encoding="utf-8"
+    ) as file:
+        next_docname = docnames[(number + 1) % len(docnames)]
+        file.write(
+            f".. _{docname}:\n\nChapter {number}\n==========\n\n"
+            f".. c:function:: void function{number}(int value)\n\n"
+            f"See :ref:`{next_docname}` and :c:func:`function{number}`.\n"
+        )
+
+
+def build(builder, parallel, **options):
+    name = "_".join([builder, str(parallel), *sorted(options)])
+    in_memory = options.pop("in_memory", False)
+    app = create_app(
+        path_to_project,
+        os.path.join(path_to_build, name),
+        builder,
+        in_memory=in_memory,
+        parallel=parallel,
+    )
+    configure_app(app, **options)
+    merges = []
+    app.connect(
+        "env-merge-info",
+        lambda app, env, docnames, other: merges.append(docnames),
+    )
+    rebuild(app)
+    outputs = getattr(app.builder, "outputs", {})
+    return rendered_html(app), dict(outputs), len(merges)
+
+
+for builder, options in [
+    ("single_file_html", {}),
+    ("single_file_html", {"in_memory": True}),
+    ("single_file_html_without_finish", {}),
+    ("single_file_html_without_finish", {"in_memory": True}),
+    ("single_file_html_without_finish", {"per_document": True}),
+]:
+    serial_html, serial_outputs, _ = build(builder, 1, **dict(options))
+    html, outputs, merges = build(builder, 2, **dict(options))
+    print(
+        f"{builder} {sorted(options)}: parallel merges: {merges}, "
+        f"identical: {html == serial_html and outputs == serial_outputs}"
+    )
+
+# The minimal builder reads the documents of a target project in parallel;
+# index is the document that fragments are rendered as.
+path_to_targets = f"{path_to_build}/targets"
+shutil.rmtree(path_to_targets, ignore_errors=True)
+os.makedirs(path_to_targets)
+for docname in docnames:
+    shutil.copy(f"{path_to_project}/{docname}.rst", path_to_targets)
+
+fragment = "See :ref:`chapter3` and :c:func:`function5`."
+minimal_outputs = []
+for parallel in (1, 2):
+    app = create_app(
+        f"{project_root}/rst",
+        os.path.join(path_to_build, f"minimal{parallel}"),
+        "minimal",
+        parallel=parallel,
+    )
+    features = configure_app(app, target_project=path_to_targets)
+    minimal_outputs.append(app.builder.render_many([fragment])[0])
+    print(f"minimal {parallel}: {features['targets'].stats()}")
+print(f"minimal identical: {minimal_outputs[0] == minimal_outputs[1]}")
+print(minimal_outputs[1])
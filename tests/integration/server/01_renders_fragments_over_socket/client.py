@@ -0,0 +1,58 @@
+import os
+import socket
+import struct
+import subprocess
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+address = os.path.join(path_to_build, "server.sock")
+
+sys.path.insert(0, project_root)
+from converter.fragment_server import (  # noqa: E402
+    FragmentClient,
+    recv_message,
+)
+
+os.makedirs(path_to_build, exist_ok=True)
+
+server = subprocess.Popen(
+    [
+        sys.executable,
+        os.path.join(project_root, "generate_rst_fragment_to_html.py"),
+        "minimal",
+        os.path.join(project_root, "rst"),
+        path_to_build,
+        "--serve",
+        address,
+        "--max-message-bytes",
+        "1024",
+    ],
+    stdout=subprocess.PIPE,
+    text=True,
+)
+print(server.stdout.readline(), end="")
+
+
+def send_raw(payload: bytes, size=None) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        size = len(payload) if size is None else size
+        sock.sendall(struct.pack(">I", size) + payload)
+        return recv_message(sock)
+
+
+# A connected client that sends nothing does not hold up the others.
+with FragmentClient(address) as idle_client:
+    with FragmentClient(address) as client:
+        print(client.render("Hello **first** fragment"))
+        print(client.render("Hello *second* fragment"))
+
+    print(send_raw(b"[]")["error"])
+    print(send_raw(b"not json")["error"])
+    print(send_raw(b"", size=2**32 - 1)["error"])
+
+    with FragmentClient(address) as client:
+        client.shutdown_server()
+
+assert server.wait(timeout=30) == 0
@@ -0,0 +1,58 @@
+import logging
+import os
+import re
+import shutil
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+path_to_project = sys.argv[3]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app, enable_target_index  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+path_to_index = f"{path_to_build}/targets.pickle"
+path_to_copy = f"{path_to_build}/project"
+if os.path.exists(path_to_index):
+    os.unlink(path_to_index)
+shutil.rmtree(path_to_copy, ignore_errors=True)
+shutil.copytree(path_to_project, path_to_copy)
+
+FRAGMENT = (
+    "See :ref:`install`, :doc:`guide`, :c:func:`imu_read`, "
+    ":cpp:class:`Imu`, :cpp:struct:`a429_t`, :py:func:`calibrate` and "
+    ":c:func:`missing`."
+)
+
+
+def print_links(app) -> None:
+    html = app.builder.render_many([FRAGMENT])[0]
+    print(" ".join(re.findall(r'href="([^"]*)"', html)) or "no links")
+
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+print_links(app)
+
+target_index = enable_target_index(app, path_to_index, path_to_copy)
+print(f"first run: {target_index.stats()}")
+print_links(app)
+
+# Only the changed document is read again, and installed again in place.
+with open(f"{path_to_copy}/guide.rst", encoding="utf-8") as file:
+    guide = file.read()
+with open(f"{path_to_copy}/guide.rst", "w", encoding="utf-8") as file:
+    file.write(guide.replace(".. _install:", ".. _setup:"))
+target_index.update_from_directory(app, path_to_copy)
+target_index.install(app)
+target_index.save(path_to_index)
+print(f"second run: {target_index.stats()}")
+print_links(app)
+
+# A new app loads the saved index and forgets the removed document.
+os.unlink(f"{path_to_copy}/api/imu.rst")
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+target_index = enable_target_index(app, path_to_index, path_to_copy)
+print(f"third run: {target_index.stats()}")
+print_links(app)
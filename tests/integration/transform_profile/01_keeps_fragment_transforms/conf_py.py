@@ -0,0 +1,39 @@
+import logging
+import shutil
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+FRAGMENT = '"Quoted" text -- with dashes...\n'
+
+CONF_PY = {
+    # The converter registers the values after reading conf.py.
+    "late": 'fragment_transforms_deny = ["*"]\n',
+    # Sphinx registers them before applying conf.py.
+    "extension": (
+        'extensions = ["builders.transform_profile"]\n'
+        'fragment_transforms_deny = ["SphinxSmartQuotes"]\n'
+    ),
+}
+
+for name, conf_py in CONF_PY.items():
+    path_to_rst_tree = f"{path_to_build}/{name}/rst"
+    shutil.rmtree(path_to_rst_tree, ignore_errors=True)
+    shutil.copytree(f"{project_root}/rst", path_to_rst_tree)
+    with open(f"{path_to_rst_tree}/conf.py", "w", encoding="utf8") as file:
+        file.write(conf_py)
+
+    app = create_app(
+        path_to_rst_tree,
+        f"{path_to_build}/{name}",
+        "minimal",
+        confdir=path_to_rst_tree,
+    )
+    print(f"{name}: deny: {app.config.fragment_transforms_deny}")
+    print(f"{name}: {app.builder.render_many([FRAGMENT])[0]}", end="")
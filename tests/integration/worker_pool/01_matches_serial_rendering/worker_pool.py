@@ -0,0 +1,27 @@
+import logging
+import sys
+
+project_root = sys.argv[1]
+path_to_build = sys.argv[2]
+
+sys.path.insert(0, project_root)
+from converter.app import create_app  # noqa: E402
+from converter.worker_pool import FragmentWorkerPool  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+app = create_app(f"{project_root}/rst", path_to_build, "minimal")
+
+fragments = [f"Fragment **{i}**" for i in range(20)]
+with FragmentWorkerPool(app, workers=2, chunk_size=3) as pool:
+    outputs = pool.render_many(fragments)
+    stats = pool.stats()
+
+print(outputs[0])
+print(outputs[19])
+print(f"identical: {outputs == app.builder.render_many(fragments)}")
+print(f"workers: {stats['workers']}, chunk size: {stats['chunk_size']}")
+print(
+    "rendered by workers: "
+    f"{sum(s['fragments'] for s in stats['per_worker'].values())}"
+)